@@ -0,0 +1,158 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from highlight_store import Highlight, HighlightStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS highlights (
+    document TEXT NOT NULL,
+    user TEXT NOT NULL,
+    text_key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    type TEXT NOT NULL,
+    note TEXT,
+    emotion TEXT,
+    profile TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (document, user, text_key)
+);
+CREATE INDEX IF NOT EXISTS highlights_by_emotion ON highlights (document, user, emotion);
+"""
+
+
+class AnnotationDatabase:
+    """
+    Durable storage of highlights and notes in SQLite, per document and user.
+
+    Writes are queued and committed by a background thread in batches, every flush_interval seconds or once batch_size
+    records are waiting, so request handlers never wait for the disk. Records store the name of their haptic settings
+    profile, which is resolved against profiles (name: settings dict) when loading; records of a profile that no longer
+    exists get the default_profile instead.
+    """
+
+    def __init__(self, path: str, profiles: Dict[str, dict], flush_interval: float = 0.5, batch_size: int = 500,
+                 default_profile: str = "neutral"):
+        self.path = path
+        self.profiles = profiles
+        self.default_profile = default_profile
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._profile_names = {id(profile): name for name, profile in profiles.items()}
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="annotation-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, document: str, user: str, highlight: Highlight):
+        """
+        Queue a highlight for writing. A later save of the same text replaces it before it is written.
+        """
+        row = (document, user, HighlightStore.normalize(highlight.text), highlight.text, highlight.type,
+               highlight.note, highlight.emotion, self._profile_names[id(highlight.profile)], time.time())
+        with self._cond:
+            self._pending[row[:3]] = row
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+
+    def delete(self, document: str, user: str, text: str):
+        self.flush()
+        with self._db_lock, self._connection:
+            self._connection.execute("DELETE FROM highlights WHERE document = ? AND user = ? AND text_key = ?",
+                                     (document, user, HighlightStore.normalize(text)))
+
+    def load(self, document: str, user: str) -> List[Highlight]:
+        """
+        Load the highlights of a document and user, oldest first, in one query.
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT text, type, note, emotion, profile FROM highlights WHERE document = ? AND user = ? ORDER BY updated",
+                (document, user)).fetchall()
+        return [self._highlight(row) for row in rows]
+
+    def load_all(self) -> Dict[Tuple[str, str], List[Highlight]]:
+        """
+        Load the highlights of every document and user, keyed by (document, user), oldest first, in one query. The
+        documents and users are ordered by their latest update.
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT document, user, text, type, note, emotion, profile FROM highlights ORDER BY updated").fetchall()
+        documents = {}
+        for row in rows:
+            highlights = documents.pop(row[:2], [])
+            highlights.append(self._highlight(row[2:]))
+            documents[row[:2]] = highlights
+        return documents
+
+    def by_emotion(self, document: str, user: str, emotion: str) -> List[Highlight]:
+        """
+        Get the notes of a document and user whose detected emotion is emotion.
+        """
+        self.flush()
+        with self._db_lock:
+            rows = self._connection.execute(
+                "SELECT text, type, note, emotion, profile FROM highlights WHERE document = ? AND user = ? AND emotion = ? "
+                "ORDER BY updated", (document, user, emotion)).fetchall()
+        return [self._highlight(row) for row in rows]
+
+    def flush(self):
+        """
+        Write all queued highlights now.
+        """
+        with self._cond:
+            rows = list(self._pending.values())
+            self._pending.clear()
+        if not rows:
+            return
+        try:
+            with self._db_lock, self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO highlights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.Error:
+            with self._cond:
+                for row in rows:
+                    self._pending.setdefault(row[:3], row)  # keep newer saves of the same text
+            raise
+
+    def close(self):
+        """
+        Write the queued highlights and close the database.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        self._connection.close()
+
+    def _highlight(self, row) -> Highlight:
+        text, type, note, emotion, profile = row
+        settings = self.profiles.get(profile)
+        if settings is None:
+            settings = self.profiles[self.default_profile]
+        return Highlight(text, settings, type, note, emotion)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                running = self._running
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Saving annotations failed: {e}")
+            if not running:
+                return
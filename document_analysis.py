@@ -0,0 +1,137 @@
+import codecs
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Tuple
+
+# a sentence ends at ., ! or ? (and any closing quotes or brackets) followed by whitespace, or at a blank line
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n[ \t\r\f\v]*\n\s*")
+MAX_SENTENCE_CHARS = 2000  # longer runs without a sentence end are split at a space
+
+# emotion of a sentence and its emotion scores, as returned by the classify function of analyze_document
+Result = Tuple[str, Dict[str, int]]
+
+
+def read_text(stream, chunk_size: int = 65536, encoding: str = "utf-8") -> Iterator[str]:
+    """
+    Decode a binary stream (e.g. a chunked request body) piece by piece, without reading it whole.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def split_sentences(pieces: Iterable[str], max_length: int = MAX_SENTENCE_CHARS) -> Iterator[Tuple[int, str]]:
+    """
+    Split text arriving in pieces into sentences, yielding (offset of the sentence in the text, sentence without
+    surrounding whitespace) as soon as each one is complete. Only the unfinished sentence is kept between pieces.
+    """
+    buffer = ""
+    offset = 0  # of buffer in the text
+    for piece in pieces:
+        buffer += piece
+        start = 0
+        for match in SENTENCE_END.finditer(buffer):
+            yield from _sentence(buffer[start:match.end()], offset + start)
+            start = match.end()
+        while len(buffer) - start > max_length:
+            cut = buffer.rfind(" ", start, start + max_length)
+            cut = cut if cut > start else start + max_length
+            yield from _sentence(buffer[start:cut], offset + start)
+            start = cut
+        buffer = buffer[start:]
+        offset += start
+    yield from _sentence(buffer, offset)
+
+
+def _sentence(text: str, offset: int) -> Iterator[Tuple[int, str]]:
+    sentence = text.strip()
+    if sentence:
+        yield offset + len(text) - len(text.lstrip()), sentence
+
+
+def sentence_key(sentence: str) -> int:
+    """
+    64-bit hash of a sentence, ignoring case and whitespace.
+    """
+    digest = hashlib.blake2b(" ".join(sentence.lower().split()).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class DocumentCache:
+    """
+    Results of the sentences of recently analyzed documents by sentence_key, so analyzing an edited document again
+    only classifies its changed sentences. Holds the latest analysis of up to max_documents documents with at most
+    max_sentences sentences in total, evicting the least recently used documents first; a document with more
+    sentences than that is not kept at all.
+    """
+
+    def __init__(self, max_documents: int = 100, max_sentences: int = 500000):
+        self.max_documents = max_documents
+        self.max_sentences = max_sentences
+        self.sentences = 0
+        self._documents = OrderedDict()  # document -> sentences
+        self._lock = threading.Lock()
+
+    def get(self, document: Hashable) -> Dict[int, Result]:
+        with self._lock:
+            sentences = self._documents.get(document)
+            if sentences is None:
+                return {}
+            self._documents.move_to_end(document)
+            return sentences
+
+    def put(self, document: Hashable, sentences: Dict[int, Result]):
+        with self._lock:
+            previous = self._documents.pop(document, None)
+            if previous is not None:
+                self.sentences -= len(previous)
+            if len(sentences) > self.max_sentences:
+                return
+            self._documents[document] = sentences
+            self.sentences += len(sentences)
+            while len(self._documents) > self.max_documents or self.sentences > self.max_sentences:
+                _, evicted = self._documents.popitem(last=False)
+                self.sentences -= len(evicted)
+
+
+def analyze_document(sentences: Iterable[Tuple[int, str]], classify: Callable[[List[str]], List[Result]],
+                     previous: Dict[int, Result], current: Dict[int, Result],
+                     batch_size: int = 64) -> Iterator[Tuple[int, str, Result, bool]]:
+    """
+    Classify sentences given as (offset, sentence), batch_size at a time, through classify (lower case sentences ->
+    their results). Yields (offset, sentence, result, cached) in document order, cached being True for sentences
+    found in previous, which are not classified again. Every result is added to current; equal results are stored
+    once, so current stays small even for documents with many sentences.
+    """
+    shared = {}
+    for batch in batched(sentences, batch_size):
+        keys = [sentence_key(sentence) for _, sentence in batch]
+        results = [previous.get(key) or current.get(key) for key in keys]
+        cached = [result is not None for result in results]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            for i, (emotion, scores) in zip(misses, classify([batch[i][1].lower() for i in misses])):
+                results[i] = shared.setdefault((emotion, tuple(scores.items())), (emotion, scores))
+        for (offset, sentence), key, result, hit in zip(batch, keys, results, cached):
+            current[key] = result
+            yield offset, sentence, result, hit
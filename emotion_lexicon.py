@@ -0,0 +1,507 @@
+import json
+import mmap
+import os
+import sys
+import threading
+from collections import Counter, OrderedDict
+from itertools import repeat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+NRC_LEXICON_FILE = "nrc_en.json"
+COMPILED_MAGIC = b"EMOLEX\x00\x01"
+
+# emotion scores of a word as (emotion, count) pairs, in the order the emotions are first counted
+Scores = Tuple[Tuple[str, int], ...]
+
+
+def find_nrc_lexicon() -> str:
+    """
+    Find the NRC emotion lexicon (word -> list of emotions) shipped with the nrclex package.
+    """
+    import nrclex
+    package_dir = os.path.dirname(nrclex.__file__)
+    for candidate in (os.path.join(package_dir, "data", NRC_LEXICON_FILE), os.path.join(package_dir, NRC_LEXICON_FILE),
+                      os.path.join(os.path.dirname(package_dir), NRC_LEXICON_FILE)):
+        if os.path.exists(candidate):
+            return candidate
+    raise FileNotFoundError(f"{NRC_LEXICON_FILE} not found in the nrclex package")
+
+
+def _scores(emotions: Iterable[str]) -> Scores:
+    return tuple(Counter(emotions).items())
+
+
+def _emotions(all_scores: Iterable[Scores]) -> List[str]:
+    return list(dict.fromkeys(emotion for scores in all_scores for emotion, _ in scores))
+
+
+def score_rows(all_scores: Iterable[Scores], emotions: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Lay out scores as rows of a (word x emotion) matrix of counts, plus the matrix of the position of each emotion
+    within a word's scores (len(emotions) where it has none), in the column order of emotions.
+    """
+    columns = {emotion: column for column, emotion in enumerate(emotions)}
+    all_scores = list(all_scores)
+    scores = np.zeros((len(all_scores), len(emotions)), dtype=np.int32)
+    order = np.full((len(all_scores), len(emotions)), len(emotions), dtype=np.int32)
+    for row, word_scores in enumerate(all_scores):
+        for position, (emotion, count) in enumerate(word_scores):
+            column = columns.get(emotion)
+            if column is not None:
+                scores[row, column] = count
+                order[row, column] = position
+    return scores, order
+
+
+def approximate_size(value) -> int:
+    """
+    Estimate the memory used by value in bytes, including the strings, numbers and containers it holds.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item) for item in value)
+    return size
+
+
+class LRUCache:
+    """
+    Thread-safe mapping that keeps at most max_entries entries and/or max_bytes bytes (keys and values, estimated with
+    approximate_size), evicting the least recently used entries first. Hits and misses of get are counted.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = approximate_size(key) + approximate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries) or
+                                     (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+_END = None  # trie key of the labels of a phrase ending at a node
+
+
+class PhraseMatcher:
+    """
+    Token trie of labelled phrases (e.g. {"anticipation": ["eager", "looking forward"]}) that finds every single- and
+    multi-word phrase in a token list in one pass, walking at most the longest phrase's length from each token. A phrase
+    listed under several labels counts for each of them.
+    """
+
+    def __init__(self, phrases: Dict[str, List[str]]):
+        self.labels = list(phrases)
+        self._root = {}
+        for label, entries in phrases.items():
+            for phrase in entries:
+                node = self._root
+                for token in phrase.lower().split():
+                    node = node.setdefault(token, {})
+                labels = node.setdefault(_END, [])
+                if label not in labels:
+                    labels.append(label)
+        # tokens a phrase can start with, to skip texts without any quickly
+        self.first_tokens = frozenset(self._root)
+
+    def matches(self, tokens: List[str]) -> Iterator[Tuple[int, int, List[str]]]:
+        """
+        Yield (start, end, labels) of every phrase in tokens, tokens[start:end] being the phrase.
+        """
+        root = self._root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            end = start + 1
+            while node is not None:
+                labels = node.get(_END)
+                if labels is not None:
+                    yield start, end, labels
+                if end == len(tokens):
+                    break
+                node = node.get(tokens[end])
+                end += 1
+
+    def counts(self, tokens: List[str]) -> Dict[str, int]:
+        """
+        Count the phrases of each label in tokens. Labels without a match are left out; the others keep the order they
+        were given in.
+        """
+        found = Counter()
+        for _, _, labels in self.matches(tokens):
+            found.update(labels)
+        return {label: found[label] for label in self.labels if label in found}
+
+
+class EmotionLexicon:
+    """
+    Index from lemma to emotion scores, built once from the NRC lexicon and the emotion keywords, so classifying a note
+    is a dict lookup per token instead of an NRCLex analysis per word and synonym.
+
+    Scores are the NRC emotion counts NRCLex reports for a single word. The WordNet synonym expansion of a lemma (the sum
+    of its synonyms' scores) is computed on first use through synonyms and then kept in an LRU cache of
+    synonym_cache_entries lemmas.
+    """
+
+    def __init__(self, lexicon: Dict[str, List[str]], keywords: Dict[str, List[str]],
+                 synonyms: Callable[[str], Iterable[str]] = None, synonym_cache_entries: int = 50000):
+        self.synonyms = synonyms
+        self.scores: Dict[str, Scores] = {word: _scores(emotions) for word, emotions in lexicon.items()}
+        self.synonym_cache = LRUCache(max_entries=synonym_cache_entries)
+        self.keywords = PhraseMatcher(keywords)
+        self._vocabulary = {word: row for row, word in enumerate(self.scores)}
+
+    @classmethod
+    def load(cls, keywords: Dict[str, List[str]], synonyms: Callable[[str], Iterable[str]] = None,
+             path: str = None, **options) -> "EmotionLexicon":
+        """
+        Build the index from the NRC lexicon file at path (by default the one of the nrclex package).
+        """
+        with open(path or find_nrc_lexicon(), encoding="utf-8") as f:
+            return cls(json.load(f), keywords, synonyms, **options)
+
+    def keyword_counts(self, tokens: List[str]) -> Dict[str, int]:
+        """
+        Count the emotion keywords and key phrases (such as "taken aback") of each emotion in tokens.
+        """
+        return self.keywords.counts(tokens)
+
+    def keyword_emotion(self, tokens: List[str]) -> Optional[str]:
+        """
+        Get the emotion with the most keywords in tokens, the one listed first in the keywords on a tie, or None if
+        there are no keywords.
+        """
+        counts = self.keywords.counts(tokens)
+        return max(counts, key=counts.get) if counts else None
+
+    def word_scores(self, word: str) -> Scores:
+        """
+        Get the NRC emotion scores of a word, empty if it is not in the lexicon.
+        """
+        return self.scores.get(word, ())
+
+    def score_matrix(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Get the emotions and the scores of every lexicon word as matrices, see score_rows.
+        """
+        emotions = _emotions(self.scores.values())
+        return (emotions,) + score_rows(self.scores.values(), emotions)
+
+    def rows(self, tokens: List[str]) -> np.ndarray:
+        """
+        Get the row of each token in score_matrix, -1 for tokens not in the lexicon.
+        """
+        return np.fromiter(map(self._vocabulary.get, tokens, repeat(-1)), dtype=np.int64, count=len(tokens))
+
+    def synonym_scores(self, token: str) -> Scores:
+        """
+        Get the summed scores of the WordNet synonyms of token.
+        """
+        scores = self.synonym_cache.get(token)
+        if scores is None:
+            scores = self._expand(token)
+            self.synonym_cache.put(token, scores)
+        return scores
+
+    def _expand(self, token: str) -> Scores:
+        counter = Counter()
+        for synonym in sorted(self.synonyms(token)) if self.synonyms else ():
+            for emotion, count in self.word_scores(synonym):
+                counter[emotion] += count
+        return tuple(counter.items())
+
+    def emotion_scores(self, tokens: Iterable[str]) -> Counter:
+        """
+        Add up the emotion scores of tokens. Synonyms of a token are only consulted while nothing has been found yet.
+        """
+        counter = Counter()
+        for token in tokens:
+            for emotion, count in self.word_scores(token):
+                counter[emotion] += count
+            if not counter:
+                for emotion, count in self.synonym_scores(token):
+                    counter[emotion] += count
+        return counter
+
+    def classify(self, tokens: List[str]) -> Tuple[str, Counter]:
+        """
+        Get the dominant emotion of tokens (lemmatized, lower case) and the emotion scores it was picked from: the
+        emotion of a keyword if there is one, otherwise the highest scoring emotion, or "neutral".
+        """
+        emotion = self.keyword_emotion(tokens)
+        if emotion is not None:
+            return emotion, Counter()
+        counter = self.emotion_scores(tokens)
+        if counter:
+            return max(counter, key=counter.get), counter
+        return "neutral", counter
+
+
+def compile_lexicon(path: str, words: Iterable[str] = (), synonyms: Callable[[str], Iterable[str]] = None,
+                    lexicon_path: str = None):
+    """
+    Compile the NRC lexicon at lexicon_path (by default the one of the nrclex package) into one file for
+    CompiledLexicon: the lexicon words and words in a sorted string table, with the scores of each word and, with
+    synonyms, the summed scores of its synonyms (as EmotionLexicon.synonym_scores) in fixed-width arrays.
+    """
+    lexicon = EmotionLexicon.load({}, synonyms, lexicon_path, synonym_cache_entries=1)
+    emotions = _emotions(lexicon.scores.values())
+    table = sorted({word.encode("utf-8") for word in lexicon.scores} | {word.encode("utf-8") for word in words})
+    strings = [word.decode("utf-8") for word in table]
+
+    offsets = np.zeros(len(table) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(word) for word in table])
+    word_scores, word_order = score_rows(map(lexicon.word_scores, strings), emotions)
+    if synonyms is not None:
+        synonym_scores, synonym_order = score_rows(map(lexicon.synonym_scores, strings), emotions)
+    else:
+        synonym_scores, synonym_order = np.zeros_like(word_scores), np.zeros_like(word_order)
+    sections = {"offsets": offsets,
+                "scores": np.stack([word_scores, synonym_scores]).astype(np.uint16),
+                "order": np.stack([word_order, synonym_order]).astype(np.uint8)}
+
+    header = {"emotions": emotions, "words": len(table), "synonyms": synonyms is not None, "byteorder": sys.byteorder,
+              "sections": {}}
+    position = 0
+    for name, array in sections.items():
+        header["sections"][name] = position
+        position += array.nbytes
+    header["sections"]["strings"] = position
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(COMPILED_MAGIC) + 4 + len(header_bytes)) % 8)
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(COMPILED_MAGIC)
+        f.write(len(header_bytes).to_bytes(4, "little"))
+        f.write(header_bytes)
+        for array in sections.values():
+            f.write(array.tobytes())
+        f.write(b"".join(table))
+    os.replace(temporary, path)
+
+
+class CompiledLexicon(EmotionLexicon):
+    """
+    EmotionLexicon read from a file written by compile_lexicon. The file is memory-mapped read only, so every process
+    using it shares one copy in the page cache instead of building its own dicts. Words are found by binary search in
+    the sorted string table.
+
+    Synonym expansions come from the file for the words in it; for other tokens (and if the file was compiled without
+    synonyms) they are computed through synonyms, like in EmotionLexicon. The scores and synonym expansions of recently
+    seen tokens are cached, synonym_cache_entries of each.
+    """
+
+    def __init__(self, path: str, keywords: Dict[str, List[str]], synonyms: Callable[[str], Iterable[str]] = None,
+                 synonym_cache_entries: int = 50000):
+        self.path = path
+        self.synonyms = synonyms
+        self.synonym_cache = LRUCache(max_entries=synonym_cache_entries)
+        self.word_cache = LRUCache(max_entries=synonym_cache_entries)
+        self.keywords = PhraseMatcher(keywords)
+
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(COMPILED_MAGIC)] != COMPILED_MAGIC:
+            raise ValueError(f"{path} is not a compiled emotion lexicon")
+        start = len(COMPILED_MAGIC) + 4
+        length = int.from_bytes(self._map[len(COMPILED_MAGIC):start], "little")
+        header = json.loads(self._map[start:start + length])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was compiled on a {header['byteorder']} endian machine")
+        base = start + length
+        sections = {name: base + offset for name, offset in header["sections"].items()}
+
+        self.emotions: List[str] = header["emotions"]
+        self.expanded: bool = header["synonyms"]
+        self.size: int = header["words"]
+        width = len(self.emotions)
+        self._offsets = memoryview(self._map)[sections["offsets"]:sections["offsets"] + 4 * (self.size + 1)].cast("I")
+        self._strings = sections["strings"]
+        self._scores = np.frombuffer(self._map, np.uint16, 2 * self.size * width, sections["scores"])
+        self._order = np.frombuffer(self._map, np.uint8, 2 * self.size * width, sections["order"])
+        self._scores, self._order = self._scores.reshape(2, self.size, width), self._order.reshape(2, self.size, width)
+        self._score_values = memoryview(self._map)[sections["scores"]:sections["scores"] + self._scores.nbytes].cast("H")
+        self._order_values = memoryview(self._map)[sections["order"]:sections["order"] + self._order.nbytes]
+
+    def find(self, word: str) -> int:
+        """
+        Get the row of word in the string table, or -1.
+        """
+        key = word.encode("utf-8")
+        offsets, data, base = self._offsets, self._map, self._strings
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            candidate = data[base + offsets[middle]:base + offsets[middle + 1]]
+            if candidate < key:
+                low = middle + 1
+            elif candidate > key:
+                high = middle
+            else:
+                return middle
+        return -1
+
+    def _row_scores(self, kind: int, row: int) -> Scores:
+        width = len(self.emotions)
+        start = (kind * self.size + row) * width
+        counts = self._score_values[start:start + width]
+        if not any(counts):
+            return ()
+        order = self._order_values[start:start + width]
+        columns = sorted((column for column in range(width) if counts[column]), key=order.__getitem__)
+        return tuple((self.emotions[column], counts[column]) for column in columns)
+
+    def word_scores(self, word: str) -> Scores:
+        scores = self.word_cache.get(word)
+        if scores is None:
+            row = self.find(word)
+            scores = self._row_scores(0, row) if row >= 0 else ()
+            self.word_cache.put(word, scores)
+        return scores
+
+    def synonym_scores(self, token: str) -> Scores:
+        scores = self.synonym_cache.get(token)
+        if scores is None:
+            row = self.find(token) if self.expanded else -1
+            scores = self._row_scores(1, row) if row >= 0 else self._expand(token)
+            self.synonym_cache.put(token, scores)
+        return scores
+
+    def score_matrix(self) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        return self.emotions, self._scores[0], self._order[0]
+
+    def rows(self, tokens: List[str]) -> np.ndarray:
+        found = {token: self.find(token) for token in set(tokens)}
+        return np.fromiter(map(found.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+
+
+class EmotionMatrix:
+    """
+    Matrix form of an EmotionLexicon for classifying many notes at once: every lexicon word has a row of scores
+    (word x emotion counts), so a batch of notes scores as one bag-of-words product.
+
+    order holds the position of each emotion within a word's scores, so ties are broken exactly like
+    EmotionLexicon.classify: in favour of the emotion counted first.
+    """
+
+    def __init__(self, lexicon: EmotionLexicon):
+        self.lexicon = lexicon
+        self.emotions, self.scores, self.order = lexicon.score_matrix()
+        self.scored = self.scores.any(axis=1)
+
+    def classify(self, notes: List[List[str]], with_scores: bool = False) -> List[Tuple[str, Optional[Dict[str, int]]]]:
+        """
+        Classify notes, each a list of tokens (lemmatized, lower case), like EmotionLexicon.classify. Returns the
+        dominant emotion of every note, and with with_scores its emotion scores in the order they were first counted.
+        """
+        count = len(notes)
+        lengths = np.fromiter((len(tokens) for tokens in notes), dtype=np.int64, count=count)
+        starts = np.cumsum(lengths) - lengths
+        flat = [token for tokens in notes for token in tokens]
+        rows = self.lexicon.rows(flat)
+        note_ids = np.repeat(np.arange(count), lengths)
+        positions = np.arange(len(flat)) - np.repeat(starts, lengths)
+
+        # only notes with a token that starts a keyword phrase need the phrase matcher
+        keyword_emotions = [None] * count
+        may_match = np.fromiter(map(self.lexicon.keywords.first_tokens.__contains__, flat), dtype=bool, count=len(flat))
+        for note_id in np.unique(note_ids[may_match]):
+            keyword_emotions[note_id] = self.lexicon.keyword_emotion(notes[note_id])
+        by_keyword = np.fromiter((emotion is not None for emotion in keyword_emotions), dtype=bool, count=count)
+        used = (rows >= 0) & ~by_keyword[note_ids]
+        used[used] = self.scored[rows[used]]
+
+        # a token's synonyms count while nothing has been counted for its note, i.e. only the first token with any
+        # scoring synonyms before the note's first scored token
+        never = np.iinfo(np.int64).max
+        first_scored = np.full(count, never, dtype=np.int64)
+        scored_notes, first_index = np.unique(note_ids[used], return_index=True)  # tokens are in note order
+        first_scored[scored_notes] = positions[used][first_index]
+        candidates = np.flatnonzero((positions < first_scored[note_ids]) & ~by_keyword[note_ids])
+        candidate_tokens = [flat[index] for index in candidates]
+        has_synonyms = {token: bool(self.lexicon.synonym_scores(token)) for token in set(candidate_tokens)}
+        candidates = candidates[np.fromiter(map(has_synonyms.__getitem__, candidate_tokens), dtype=bool,
+                                            count=len(candidate_tokens))]
+        candidates = candidates[np.unique(note_ids[candidates], return_index=True)[1]]
+        synonym_rows = {}  # token -> row of its synonym scores
+        extra_rows = [synonym_rows.setdefault(flat[index], len(synonym_rows)) for index in candidates]
+        extra_scores, extra_order = score_rows((self.lexicon.synonym_scores(token) for token in synonym_rows),
+                                               self.emotions)
+
+        note_ids = np.concatenate([note_ids[used], note_ids[candidates]])
+        positions = np.concatenate([positions[used], positions[candidates]])
+        token_scores = np.concatenate([self.scores[rows[used]], extra_scores[extra_rows]]).astype(np.int64)
+        token_order = np.concatenate([self.order[rows[used]], extra_order[extra_rows]]).astype(np.int64)
+        by_note = np.lexsort((positions, note_ids))
+        note_ids, positions = note_ids[by_note], positions[by_note]
+        token_scores, token_order = token_scores[by_note], token_order[by_note]
+
+        # bag-of-words product: add up the score rows of each note's tokens
+        width = len(self.emotions)
+        totals = np.zeros((count, width), dtype=np.int64)
+        first = np.full((count, width), never, dtype=np.int64)
+        if len(token_scores):
+            # when each emotion was first counted, to break ties like Counter insertion order
+            keys = positions[:, None] * (width + 1) + token_order
+            keys[token_scores == 0] = never
+            counted_notes, group_starts = np.unique(note_ids, return_index=True)
+            totals[counted_notes] = np.add.reduceat(token_scores, group_starts, axis=0)
+            first[counted_notes] = np.minimum.reduceat(keys, group_starts, axis=0)
+
+        best = totals.max(axis=1)
+        winners = np.where(totals == best[:, None], first, never).argmin(axis=1)
+        results = []
+        for note_id in range(count):
+            if keyword_emotions[note_id] is not None:
+                results.append((keyword_emotions[note_id], {} if with_scores else None))
+            elif best[note_id] == 0:
+                results.append(("neutral", {} if with_scores else None))
+            elif not with_scores:
+                results.append((self.emotions[winners[note_id]], None))
+            else:
+                counted = np.flatnonzero(totals[note_id])
+                counted = counted[np.argsort(first[note_id, counted])]
+                results.append((self.emotions[winners[note_id]],
+                                {self.emotions[column]: int(totals[note_id, column]) for column in counted}))
+        return results
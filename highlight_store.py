@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+class Highlight:
+    """
+    One annotated text. The haptic settings are not copied into the record: profile references the shared settings dict
+    (e.g. an entry of EMOTION_HAPTIC_MAPPINGS) the highlight was made with.
+    """
+
+    __slots__ = ("text", "note", "type", "emotion", "profile")
+
+    def __init__(self, text: str, profile: dict, type: str = "normal", note: str = None, emotion: str = None):
+        self.text = text
+        self.note = note
+        self.type = type
+        self.emotion = emotion
+        self.profile = profile
+
+    @property
+    def color(self):
+        return self.profile["color"]
+
+    @property
+    def vibration(self):
+        return self.profile["vibration"]
+
+    @property
+    def temperature(self):
+        return self.profile["temperature"]
+
+    @property
+    def intensity(self):
+        return self.profile["intensity"]
+
+    @property
+    def mode(self):
+        return self.profile["mode"]
+
+    def to_dict(self) -> Dict:
+        record = {"text": self.text, "color": self.color, "note": self.note, "vibration": self.vibration,
+                  "type": self.type, "temperature": self.temperature, "mode": self.mode, "intensity": self.intensity}
+        if self.emotion is not None:
+            record["emotion"] = self.emotion
+        return record
+
+    def __repr__(self):
+        return f"Highlight({self.text!r}, type={self.type!r}, color={self.color!r}, emotion={self.emotion!r})"
+
+
+class HighlightStore:
+    """
+    Highlights indexed by normalized text (stripped, lower case), one per text: annotating a text again replaces its
+    highlight. Holds at most capacity highlights; when full, the least recently added or looked up one is evicted.
+    """
+
+    def __init__(self, capacity: int = 10000):
+        self.capacity = capacity
+        self._highlights = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return text.strip().lower()
+
+    def add(self, text: str, profile: dict, type: str = "normal", note: str = None, emotion: str = None) -> Highlight:
+        """
+        Store a highlight of text made with the haptic settings profile.
+        """
+        highlight = Highlight(text, profile, type, note, emotion)
+        key = self.normalize(text)
+        with self._lock:
+            self._highlights[key] = highlight
+            self._highlights.move_to_end(key)
+            while len(self._highlights) > self.capacity:
+                self._highlights.popitem(last=False)
+        return highlight
+
+    def load(self, highlights: Iterable[Highlight]):
+        """
+        Add many highlights at once, oldest first, e.g. from an AnnotationDatabase.
+        """
+        with self._lock:
+            for highlight in highlights:
+                key = self.normalize(highlight.text)
+                self._highlights[key] = highlight
+                self._highlights.move_to_end(key)
+            while len(self._highlights) > self.capacity:
+                self._highlights.popitem(last=False)
+
+    def get(self, text: str) -> Optional[Highlight]:
+        """
+        Get the highlight of text (compared normalized), or None.
+        """
+        key = self.normalize(text)
+        with self._lock:
+            highlight = self._highlights.get(key)
+            if highlight is not None:
+                self._highlights.move_to_end(key)
+            return highlight
+
+    def remove(self, text: str) -> Optional[Highlight]:
+        with self._lock:
+            return self._highlights.pop(self.normalize(text), None)
+
+    def highlights(self) -> List[Highlight]:
+        """
+        Get all highlights, least recently used first.
+        """
+        with self._lock:
+            return list(self._highlights.values())
+
+    def clear(self):
+        with self._lock:
+            self._highlights.clear()
+
+    def __contains__(self, text: str):
+        with self._lock:
+            return self.normalize(text) in self._highlights
+
+    def __len__(self):
+        with self._lock:
+            return len(self._highlights)
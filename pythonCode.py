@@ -1,24 +1,24 @@
-from flask import Flask, request, send_file, jsonify
-from datafeel.device import discover_devices
-from nrclex import NRCLex
+from flask import Flask, Response, request, send_file, jsonify, stream_with_context
+from datafeel.device import DotRegistry, PortWorker, PRIORITY_HIGH, io_priority
+from datafeel.effects import (EffectScheduler, NEUTRAL_TEMP, PULSE_SECONDS, WORD_CUE_SECONDS, compile_vibration_sequence,
+                              play_haptic, revert_haptic)
+from datafeel.metrics import bus_metrics, render_metric
+from datafeel.telemetry import TelemetrySampler
+from highlight_store import Highlight, HighlightStore
+from annotation_db import AnnotationDatabase
+from document_analysis import DocumentCache, analyze_document, read_text, split_sentences
+from emotion_lexicon import LRUCache
+from sentiment_pool import COMPILED_LEXICON, PoolBusy, SentimentPool
+import json
 import time
 from collections import Counter
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-from nltk.corpus import wordnet
-import nltk
-import speech_recognition as sr
-import pyttsx3
+from concurrent.futures import TimeoutError
 import threading
 import queue
 
 
-# Ensure necessary NLTK data is downloaded
-nltk.download('wordnet')
-nltk.download('punkt')
-
-lemmatizer = WordNetLemmatizer()
-
+# NLTK, the NLP models and the speech engine are loaded in the background or on first use, so the server starts at
+# once and without network access (the NLTK data must be installed locally, see /ready)
 app = Flask(__name__)
 
 # Emotion-to-color mapping for highlighting & haptic feedback
@@ -75,22 +75,103 @@ color_rgb_mapping = {
         "green": (0, 128, 0)  # Using the standard web-safe green
 }
 
-NEUTRAL_TEMP = 0.0
-LED_NEUTRAL = (255, 255, 255)
-
-highlighted_text_data = []
-
-def adjust_intensity(color, intensity):
-    """ Adjust LED brightness by scaling RGB values based on intensity (0.5 - 1.0) """
-    return tuple(int(c * intensity) for c in color)
-
-def get_synonyms(word):
-    """Find synonyms using WordNet to increase emotion detection accuracy."""
-    synonyms = set()
-    for syn in wordnet.synsets(word):
-        for lemma in syn.lemmas():
-            synonyms.add(lemma.name().lower())
-    return list(synonyms)
+# haptic settings of notes without a detected emotion
+NEUTRAL_HAPTIC = {"led": (255, 255, 255), "color": "yellow", "vibration": 150, "temperature": 28.0, "intensity": 0.5, "mode": 1}
+
+# settings profiles highlights refer to, by name
+HAPTIC_PROFILES = dict(EMOTION_HAPTIC_MAPPINGS, neutral=NEUTRAL_HAPTIC)
+
+TELEMETRY_INTERVAL = 1.0  # seconds between telemetry reads of each dot
+TELEMETRY_SAMPLES = 600  # samples kept per dot
+
+# The services behind the routes (sentiment workers, annotation storage, dots, effects and telemetry) are started by
+# create_app, never at import time: the sentiment worker processes import this module again.
+
+# Notes are analyzed (tokenized, lemmatized and classified) by a pool of warm worker processes, so the analysis never
+# stalls the haptic and speech threads.
+# At most SENTIMENT_MAX_PENDING notes wait for a worker; beyond that, requests are turned away with a 503.
+SENTIMENT_WORKERS = None  # one per CPU core but one; 0 analyzes in the request thread
+SENTIMENT_MAX_PENDING = 32
+SENTIMENT_TIMEOUT = 5.0  # seconds per note
+BATCH_TIMEOUT = 30.0  # seconds per batch
+sentiment_pool = None
+
+# Highlights and notes are kept per document and user, and saved to ANNOTATION_DB in the background.
+# In memory, each document's highlights are indexed by normalized text; least recently used ones are evicted beyond
+# HIGHLIGHT_CAPACITY (they stay in the database). The stores of the HIGHLIGHT_STORES most recently used documents and
+# users are kept; others are loaded from the database again when needed.
+HIGHLIGHT_CAPACITY = 10000
+HIGHLIGHT_STORES = 1000
+ANNOTATION_DB = "annotations.sqlite3"
+DEFAULT_DOCUMENT = "default"
+DEFAULT_USER = "default"
+annotation_db = None
+highlight_stores = LRUCache(max_entries=HIGHLIGHT_STORES)
+highlight_stores_lock = threading.Lock()
+
+# Discover the dots once and keep them (and their serial ports) for the lifetime of the server.
+# The last known topology is cached on disk, so restarts reconnect at once and verify in the background.
+# Every DataFeel USB adapter is searched for dots at addresses 1..MAX_DOT_ADDRESS, and each bus runs on its own I/O thread.
+DISCOVERY_CACHE = "dot_topology.json"
+MAX_DOT_ADDRESS = 4
+dot_registry = None
+
+# Timed effects run on the scheduler thread, so the routes return as soon as the effect is queued
+effect_scheduler = None
+
+# Temperatures are sampled in the background and served from memory by /telemetry
+telemetry_sampler = None
+
+def annotation_scope(data):
+    """ Get the (document, user) a request refers to, from its JSON body or query string. """
+    return (str(data.get("document") or DEFAULT_DOCUMENT), str(data.get("user") or DEFAULT_USER))
+
+def highlights_for(document, user):
+    """ Get the highlight store of a document and user, loading its saved highlights if it is not in memory. """
+    with highlight_stores_lock:
+        store = highlight_stores.get((document, user))
+        if store is None:
+            store = HighlightStore(HIGHLIGHT_CAPACITY)
+            store.load(annotation_db.load(document, user))
+            highlight_stores.put((document, user), store)
+        return store
+
+# Sentiment results of recently analyzed notes, so re-submitted notes skip the worker pool entirely
+NOTE_CACHE_BYTES = 16 * 1024 * 1024
+note_cache = LRUCache(max_bytes=NOTE_CACHE_BYTES)
+MAX_BATCH_NOTES = 10000
+
+# Whole documents are analyzed sentence by sentence as they stream in. The results of the latest analysis of each
+# document are kept by sentence, so analyzing an edited document again only scores the sentences that changed.
+DOCUMENT_BATCH_SENTENCES = 64
+DOCUMENT_CACHE_DOCUMENTS = 100
+DOCUMENT_CACHE_SENTENCES = 500000  # in all documents, about 120 bytes each
+document_cache = DocumentCache(DOCUMENT_CACHE_DOCUMENTS, DOCUMENT_CACHE_SENTENCES)
+
+def note_key(text):
+    """ Normalize a note (already stripped and lower case) for the note cache. """
+    return " ".join(text.split())
+
+def analyze_note(text):
+    """
+    Get the dominant emotion of a note (stripped, lower case) and the NRC emotion scores it was picked from (empty if a
+    keyword decided). Results are remembered per note, so re-submitted notes skip the NLP work.
+    Raises PoolBusy or TimeoutError when the worker pool is overloaded.
+    """
+    key = note_key(text)
+    result = note_cache.get(key)
+    if result is None:
+        result = sentiment_pool.analyze_note(text)
+        note_cache.put(key, result)
+    return result
+
+def unavailable_response(e):
+    """ Response for a note the worker pool could not analyze (in time). """
+    if isinstance(e, PoolBusy):
+        return jsonify({"error": "Too many notes are being analyzed, try again shortly"}), 503, {"Retry-After": "1"}
+    if isinstance(e, LookupError):
+        return jsonify({"error": f"Sentiment analysis is unavailable: {e}"}), 503
+    return jsonify({"error": "Analyzing the note timed out"}), 504
 
 @app.route("/")
 def home():
@@ -114,37 +195,20 @@ def haptic_feedback():
     if not settings:
         return jsonify({"error": "Invalid color"}), 400
 
-    devices = discover_devices(4)
+    devices = dot_registry.group()
     if not devices:
         return jsonify({"error": "No dots found"}), 500
 
-    for dot in devices:
-        dot.set_led(*settings["led"])
-        dot.registers.set_vibration_mode(1)
-        dot.registers.set_vibration_frequency(settings["vibration"])
-        dot.registers.set_vibration_intensity(settings["intensity"])
-        dot.registers.set_thermal_intensity(settings["temperature"])
-
-    highlighted_text_data.append({
-    "text": text,
-    "color": color,
-    "note": None,
-    "vibration": settings["vibration"],  # ✅ Store vibration settings
-    "type": "normal",
-    "temperature": settings["temperature"],
-    "mode": settings["mode"],
-    "intensity": settings["intensity"]
-    })
-    print(highlighted_text_data)
-
+    effect_scheduler.pulse(
+        lambda: play_haptic(devices, settings["led"], settings["vibration"], settings["intensity"], settings["temperature"]),
+        lambda: revert_haptic(devices),
+        PULSE_SECONDS)
 
-    time.sleep(1.5)
-
-    for dot in devices:
-        dot.registers.set_vibration_intensity(0.0)
-        adjusted_led = adjust_intensity(LED_NEUTRAL, .3)
-        dot.set_led(*adjusted_led)
-        dot.registers.set_thermal_intensity(NEUTRAL_TEMP)
+    document, user = annotation_scope(data)
+    highlights = highlights_for(document, user)
+    highlight = highlights.add(text, settings)
+    annotation_db.save(document, user, highlight)
+    print(f"Stored {highlight} ({len(highlights)} highlights in {document!r})")
 
     return jsonify({"message": f"Haptic feedback triggered for {color}, then turned off."})
 
@@ -162,97 +226,39 @@ def analyze_sentiment():
     if not text:
         return jsonify({"error": "No text provided"}), 400
 
-    # Tokenize and lemmatize each word
-    words = [lemmatizer.lemmatize(word) for word in word_tokenize(text)]
-
-    # Step 1: Check predefined emotion keywords first
-    detected_emotion = detect_emotion_from_text(words)
-
-    # Step 2: If no keyword match, use NRCLex to analyze each word separately
-    emotion_counter = Counter()
-    if detected_emotion == "neutral":
-        for word in words:
-            analysis = NRCLex(word)  # Run NRCLex analysis
-            
-            # Ensure NRCLex actually finds meaningful values
-            for emotion, score_list in analysis.raw_emotion_scores.items():
-                if isinstance(score_list, list):  
-                    highest_score = max(score_list)  # Take highest score from list
-                else:
-                    highest_score = score_list  # If it's a single number
-
-                if highest_score > 0:  # Filter out zero-score emotions
-                    emotion_counter[emotion] += highest_score  # Accumulate scores
-
-            # If NRCLex fails, try synonyms
-            if sum(emotion_counter.values()) == 0:
-                synonyms = get_synonyms(word)
-                for synonym in synonyms:
-                    analysis = NRCLex(synonym)
-                    for emotion, score_list in analysis.raw_emotion_scores.items():
-                        highest_score = max(score_list) if isinstance(score_list, list) else score_list
-                        if highest_score > 0:
-                            emotion_counter[emotion] += highest_score
-
-        # Step 3: Select the dominant emotion
-        if emotion_counter:
-            detected_emotion = max(emotion_counter, key=emotion_counter.get)
-
+    try:
+        detected_emotion, emotion_counter = analyze_note(text)
+    except (PoolBusy, TimeoutError, LookupError) as e:
+        return unavailable_response(e)
     print(f"Detected emotions from NRCLex: {emotion_counter}")
     
     # Assign color and haptic feedback based on detected emotion
-    settings = EMOTION_HAPTIC_MAPPINGS.get(detected_emotion, {"led": (255, 255, 255), "color": "yellow", "vibration": 150, "mode": 1, "temperature": 28.0})
+    settings = EMOTION_HAPTIC_MAPPINGS.get(detected_emotion, NEUTRAL_HAPTIC)
 
-    devices = discover_devices(4)
+    devices = dot_registry.group()
     if not devices:
         return jsonify({"error": "No dots found"}), 500
 
-    for dot in devices:
-        dot.set_led(*settings["led"])
-        dot.registers.set_vibration_mode(1)
-        dot.registers.set_vibration_frequency(settings["vibration"])
-        dot.registers.set_vibration_intensity(1)
-        dot.registers.set_thermal_intensity(settings["temperature"])
-    print("This is the curr after", curr_text)
-    
-    
-    time.sleep(1.5)
-    
-    dot.registers.set_vibration_intensity(0.0)  # Stop vibration
-    
-    for dot in devices:
+    def settle():
         if detected_emotion == "neutral":
-            dot.set_led(255, 255, 255)  # White, but turn it off quickly
-            dot.registers.set_vibration_intensity(0.0)  # Stop vibration
-            dot.registers.set_thermal_intensity(NEUTRAL_TEMP)
+            devices.set_led(255, 255, 255)  # White, but turn it off quickly
+            devices.apply_state(thermal_intensity=NEUTRAL_TEMP)
         else:
-            dot.set_led(*settings["led"])
-            dot.registers.set_vibration_mode(1)
-            dot.registers.set_vibration_frequency(settings["vibration"])
-            dot.registers.set_vibration_intensity(settings["intensity"])
-            dot.registers.set_thermal_intensity(settings["temperature"])
-
-        
-    highlighted_text_data.append({
-    "text": curr_text,
-    "color": settings["color"],
-    "note": text,
-    "vibration": settings["vibration"],  # ✅ Store vibration settings
-    "type": "sense",
-    "emotion": detected_emotion,
-    "temperature": settings["temperature"],
-    "mode": settings["mode"],
-    "intensity": settings["intensity"]
-    })
-    print(highlighted_text_data)
-
-    time.sleep(1.5)
+            play_haptic(devices, settings["led"], settings["vibration"], settings["intensity"], settings["temperature"])
+
+    # Full-strength pulse, then the emotion's own intensity, then back to neutral
+    effect_scheduler.play([
+        (0.0, lambda: play_haptic(devices, settings["led"], settings["vibration"], 1, settings["temperature"])),
+        (PULSE_SECONDS, settle),
+        (2 * PULSE_SECONDS, lambda: revert_haptic(devices)),
+    ])
+    print("This is the curr after", curr_text)
 
-    for dot in devices:
-        dot.registers.set_vibration_intensity(0.0)
-        adjusted_led = adjust_intensity(LED_NEUTRAL, .3)
-        dot.set_led(*adjusted_led)
-        dot.registers.set_thermal_intensity(NEUTRAL_TEMP)
+    document, user = annotation_scope(data)
+    highlights = highlights_for(document, user)
+    highlight = highlights.add(curr_text, settings, type="sense", note=text, emotion=detected_emotion)
+    annotation_db.save(document, user, highlight)
+    print(f"Stored {highlight} ({len(highlights)} highlights in {document!r})")
 
     return jsonify({
         "message": f"Emotion detected: {detected_emotion}, color assigned: {settings['color']}, haptic feedback triggered.",
@@ -260,14 +266,192 @@ def analyze_sentiment():
         "emotion": detected_emotion, "temperature": settings["temperature"]
     })
 
-def detect_emotion_from_text(words):
+@app.route("/analyze-sentiment/batch", methods=["POST"])
+def analyze_sentiment_batch():
     """
-    Manually detects emotion by checking if any words in the list match known emotion keywords.
+    Classifies many notes at once, with the same emotion and color assignment as /analyze-sentiment, but without any
+    haptic feedback and without storing highlights. Set "scores" to also get the emotion scores of each note.
+    """
+    data = request.json or {}
+    notes = data.get("notes")
+    with_scores = bool(data.get("scores", False))
+    if not isinstance(notes, list):
+        return jsonify({"error": "notes must be a list of texts"}), 400
+    if len(notes) > MAX_BATCH_NOTES:
+        return jsonify({"error": f"At most {MAX_BATCH_NOTES} notes per request"}), 413
+
+    texts = [str(note).strip().lower() for note in notes]
+    results = [note_cache.get(note_key(text)) for text in texts]
+    misses = [i for i, result in enumerate(results) if result is None]
+    try:
+        classified = sentiment_pool.analyze_notes([texts[i] for i in misses], with_scores, BATCH_TIMEOUT)
+    except (PoolBusy, TimeoutError, LookupError) as e:
+        return unavailable_response(e)
+    for i, (emotion, scores) in zip(misses, classified):
+        if scores is None:
+            results[i] = (emotion, None)
+        else:
+            results[i] = (emotion, Counter(scores))
+            note_cache.put(note_key(texts[i]), results[i])
+
+    response = []
+    for emotion, scores in results:
+        settings = EMOTION_HAPTIC_MAPPINGS.get(emotion, NEUTRAL_HAPTIC)
+        result = {"emotion": emotion, "color": settings["color"], "temperature": settings["temperature"]}
+        if with_scores:
+            result["scores"] = dict(scores)
+        response.append(result)
+    return jsonify({"results": response})
+
+
+def classify_sentences(texts):
+    """ Classify sentences (lower case) in the worker pool, waiting up to BATCH_TIMEOUT for room in it. """
+    deadline = time.monotonic() + BATCH_TIMEOUT
+    while True:
+        try:
+            return sentiment_pool.analyze_notes(texts, True, BATCH_TIMEOUT)
+        except PoolBusy:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+@app.route("/analyze-document", methods=["POST"])
+def analyze_document_stream():
     """
-    for emotion, keywords in EMOTION_KEYWORDS.items():
-        if any(word in keywords for word in words):  # Direct match
-            return emotion
-    return "neutral"
+    Analyzes a whole document, sent as a plain text (possibly chunked) request body, sentence by sentence with the
+    same emotion and color assignment as /analyze-sentiment, but without haptic feedback and without storing anything.
+    Streams back one JSON line per sentence as soon as it is scored, then a summary line. Sentences with an emotion are
+    suggested as highlights. The document and user are given in the query string; add ?scores=1 for emotion scores.
+    """
+    document, user = annotation_scope(request.args)
+    with_scores = request.args.get("scores", default=0, type=int) == 1
+    error = sentiment_pool.error()
+    if error:
+        return unavailable_response(LookupError(error))
+    stream = request.stream
+
+    def generate():
+        previous = document_cache.get((document, user))
+        current = {}
+        emotions = Counter()
+        rescored = 0
+        sentences = analyze_document(split_sentences(read_text(stream)), classify_sentences, previous, current,
+                                     DOCUMENT_BATCH_SENTENCES)
+        try:
+            for offset, text, (emotion, scores), cached in sentences:
+                settings = EMOTION_HAPTIC_MAPPINGS.get(emotion, NEUTRAL_HAPTIC)
+                record = {"offset": offset, "text": text, "emotion": emotion, "color": settings["color"],
+                          "highlight": emotion != "neutral", "cached": cached}
+                if with_scores:
+                    record["scores"] = dict(scores)
+                emotions[emotion] += 1
+                rescored += not cached
+                yield json.dumps(record) + "\n"
+        except (PoolBusy, TimeoutError, LookupError) as e:
+            yield json.dumps({"error": f"Analyzing the document failed: {e or 'timed out'}"}) + "\n"
+            return
+        document_cache.put((document, user), current)
+        yield json.dumps({"done": True, "document": document, "user": user, "sentences": sum(emotions.values()),
+                          "rescored": rescored, "emotions": emotions}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/telemetry", methods=["GET"])
+def telemetry():
+    """
+    Returns the latest sampled temperatures and thermal power of each dot, keyed by serial number.
+    Use ?samples=N to get the last N samples instead of only the latest one.
+    """
+    samples = request.args.get("samples", default=1, type=int)
+    return jsonify({"interval": TELEMETRY_INTERVAL, "dots": telemetry_sampler.samples(samples)})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    Readiness probe: 200 once the sentiment workers have loaded the emotion lexicon, WordNet and the tokenizer, 503
+    while they are warming up or if they cannot (e.g. missing NLTK data). Highlights and speech work before that.
+    """
+    is_ready = sentiment_pool.ready()
+    sentiment = "ready" if is_ready else sentiment_pool.error() or "warming up"
+    return jsonify({"ready": is_ready, "sentiment": sentiment, "dots": len(dot_registry.dots())}), 200 if is_ready else 503
+
+
+@app.route("/annotations", methods=["GET"])
+def get_annotations():
+    """
+    Returns all saved highlights and notes of a document (?document=...&user=...), oldest first, so a client can restore
+    them without re-sending each one (and without any haptic feedback).
+    """
+    document, user = annotation_scope(request.args)
+    annotations = [highlight.to_dict() for highlight in annotation_db.load(document, user)]
+    return jsonify({"document": document, "user": user, "annotations": annotations})
+
+
+@app.route("/annotations", methods=["POST"])
+def import_annotations():
+    """
+    Stores many highlights and notes of a document at once, without haptic feedback. Each annotation has a text and
+    either a color (a highlight) or an emotion and a note (an analyzed note).
+    """
+    data = request.json
+    document, user = annotation_scope(data)
+    highlights = highlights_for(document, user)
+    imported = []
+    for annotation in data.get("annotations", []):
+        text = annotation.get("text", "")
+        if not text:
+            continue
+        if annotation.get("emotion") or annotation.get("type") == "sense":
+            emotion = annotation.get("emotion") or "neutral"
+            highlight = Highlight(text, HAPTIC_PROFILES.get(emotion, NEUTRAL_HAPTIC), "sense", annotation.get("note"), emotion)
+        else:
+            settings = next((v for v in EMOTION_HAPTIC_MAPPINGS.values() if v["color"] == annotation.get("color")), None)
+            if not settings:
+                return jsonify({"error": f"Invalid color for {text!r}"}), 400
+            highlight = Highlight(text, settings)
+        imported.append(highlight)
+
+    highlights.load(imported)
+    for highlight in imported:
+        annotation_db.save(document, user, highlight)
+    return jsonify({"message": f"Stored {len(imported)} annotations.", "document": document, "user": user})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Returns Modbus transaction counters and latency histograms per dot and register, the register and sentiment cache
+    statistics (token caches summed over the sentiment workers), and the depth of the I/O, effect and speech queues, in
+    the Prometheus text format.
+    """
+    cache = {}
+    for dot in dot_registry.dots():
+        for result, count in dot.cache_stats().items():
+            cache[(dot.serial_number, result)] = count
+    text = bus_metrics.render()
+    text += render_metric("datafeel_register_cache_lookups_total", "counter",
+                          "Register writes suppressed (hit) or sent (miss) by the register cache.", cache,
+                          ("serial_number", "result"))
+    text += render_metric("datafeel_io_queue_depth", "gauge", "Commands queued on the I/O worker of each port.",
+                          {(worker.port,): worker.depth() for worker in PortWorker.workers()}, ("port",))
+    text += render_metric("datafeel_effect_queue_depth", "gauge", "Haptic effect steps waiting to run.",
+                          {(): effect_scheduler.pending()})
+    cache_stats = {"note": note_cache.stats(), **sentiment_pool.cache_stats()}
+    for stat, kind, help in (("hits", "counter", "Sentiment cache hits."), ("misses", "counter", "Sentiment cache misses."),
+                             ("entries", "gauge", "Entries in each sentiment cache."),
+                             ("bytes", "gauge", "Estimated size of each size-limited sentiment cache.")):
+        text += render_metric(f"datafeel_sentiment_cache_{stat}" + ("_total" if kind == "counter" else ""), kind, help,
+                              {(name,): stats[stat] for name, stats in cache_stats.items()}, ("cache",))
+    text += render_metric("datafeel_sentiment_pool_pending", "gauge", "Notes queued or being analyzed by the workers.",
+                          {(): sentiment_pool.pending()})
+    text += render_metric("datafeel_sentiment_pool_rejected_total", "counter",
+                          "Analyses turned away because the worker pool was full.", {(): sentiment_pool.rejected})
+    text += render_metric("datafeel_sentiment_pool_timeouts_total", "counter",
+                          "Analyses that did not finish in time.", {(): sentiment_pool.timeouts})
+    text += render_metric("datafeel_tts_queue_depth", "gauge", "Texts waiting to be spoken.", {(): tts_queue.qsize()})
+    return Response(text, mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/replay-haptic", methods=["POST"])
@@ -278,65 +462,67 @@ def replay_haptic():
     text = data.get("text", "").strip().lower()
 
     print(f"Received request to replay haptic for: '{text}'")  # Debugging
-    print(f"Stored highlights: {highlighted_text_data}")  # Debugging
 
     # Find matching highlight
-    highlight = next((item for item in highlighted_text_data if item["text"].strip().lower() == text), None)
+    highlight = highlights_for(*annotation_scope(data)).get(text)
 
     if not highlight:
         return jsonify({"error": "No haptic feedback found for the selected text."}), 400
 
-    devices = discover_devices(4)
+    devices = dot_registry.group()
     if not devices:
         return jsonify({"error": "No haptic devices found."}), 500
 
-    if highlight.get("type") == "normal":
-        color_settings = {"led": color_rgb_mapping.get(highlight["color"], (255, 255, 255))}
+    if highlight.type == "normal":
+        color_settings = {"led": color_rgb_mapping.get(highlight.color, (255, 255, 255))}
     else:
-        emotion = highlight.get("emotion", "neutral")  # Default to "neutral" if no emotion found
+        emotion = highlight.emotion or "neutral"  # Default to "neutral" if no emotion found
         color_settings = EMOTION_HAPTIC_MAPPINGS.get(emotion, {"led": (255, 255, 255)})
 
-    for dot in devices:
-        dot.set_led(*color_settings["led"])
-        dot.registers.set_vibration_mode(highlight["mode"])
-        dot.registers.set_vibration_frequency(highlight["vibration"])
-        dot.registers.set_vibration_intensity(highlight["intensity"])
-        dot.registers.set_thermal_intensity(highlight["temperature"])
-
-    time.sleep(1.5)
-
-    for dot in devices:
-        dot.registers.set_vibration_intensity(0.0)
-        adjusted_led = adjust_intensity(LED_NEUTRAL, .3)
-        dot.set_led(*adjusted_led)
+    effect_scheduler.pulse(
+        lambda: play_haptic(devices, color_settings["led"], highlight.vibration, highlight.intensity,
+                            highlight.temperature),
+        lambda: revert_haptic(devices, reset_temperature=False),
+        PULSE_SECONDS)
 
-    return jsonify({"message": f"Replayed haptic feedback for '{text}' with color {highlight['color']}."})
+    return jsonify({"message": f"Replayed haptic feedback for '{text}' with color {highlight.color}."})
 
 
-# Initialize text-to-speech engine
-tts_engine = pyttsx3.init()
-tts_engine.setProperty("rate", 130)  # Slow down speech (default is ~200)
-tts_engine.setProperty('voice', "HKEY_LOCAL_MACHINE\\SOFTWARE\\Microsoft\\Speech\\Voices\\Tokens\\TTS_MS_EN-US_ZIRA_11.0")
+def init_tts_engine():
+    """ Initialize the text-to-speech engine (in the thread that will use it). """
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty("rate", 130)  # Slow down speech (default is ~200)
+    engine.setProperty('voice', "HKEY_LOCAL_MACHINE\\SOFTWARE\\Microsoft\\Speech\\Voices\\Tokens\\TTS_MS_EN-US_ZIRA_11.0")
+    return engine
 
 # Global Variables
 tts_queue = queue.Queue()  # Speech queue
 tts_running = False  # Flag for speech state
 stop_tts = threading.Event()  # Event to stop speech immediately
+tts_thread = None  # started on the first text to read aloud
+tts_thread_lock = threading.Lock()
 
 
 def tts_worker():
     """ Background thread that reads aloud from the queue and triggers haptic feedback. """
     global tts_running
+    try:
+        tts_engine = init_tts_engine()
+    except Exception as e:  # e.g. no speech driver; the words are still cued on the dots
+        print(f"⚠️ Text-to-speech unavailable: {e}")
+        tts_engine = None
     while True:
-        text = tts_queue.get()  # Get text to speak
-        if text is None:
+        item = tts_queue.get()  # Get text to speak, and the highlights of its document
+        if item is None:
             break  # Stop worker if None received
+        text, highlights = item
 
         words = text.split()
         tts_running = True
         stop_tts.clear()  # Reset stop event
 
-        devices = discover_devices(4)  # Find haptic devices
+        devices = dot_registry.group()  # Registered haptic devices
         if not devices:
             print("⚠️ No haptic devices found.")
         
@@ -346,33 +532,36 @@ def tts_worker():
                 break
             
             print(f"🔊 Speaking: {word}")
-            tts_engine.say(word)
-            tts_engine.runAndWait()  # Process speech queue
+            if tts_engine is not None:
+                tts_engine.say(word)
+                tts_engine.runAndWait()  # Process speech queue
 
             # Trigger haptic feedback if word was annotated
-            highlight = next((item for item in highlighted_text_data if item["text"].strip().lower() == word.lower()), None)
+            highlight = highlights.get(word)
             if highlight and devices:
-                color = highlight["color"]
-                vibration = highlight["vibration"]
-                settings = EMOTION_HAPTIC_MAPPINGS.get(highlight.get("emotion", "neutral"), {"led": (255, 255, 255),  "vibration": 150, "mode": 1, "temperature": 28.0})
+                vibration = highlight.vibration
+                settings = EMOTION_HAPTIC_MAPPINGS.get(highlight.emotion or "neutral", NEUTRAL_HAPTIC)
 
-                for dot in devices:
-                    dot.set_led(*settings["led"])
-                    dot.registers.set_vibration_frequency(vibration)
-                    dot.registers.set_vibration_intensity(1.0)
+                # word cues go ahead of background bus traffic
+                with io_priority(PRIORITY_HIGH):
+                    devices.set_led(*settings["led"])
+                    devices.play_vibration_sequence(compile_vibration_sequence(vibration, 1.0, WORD_CUE_SECONDS))
 
-            time.sleep(0.4)  # Small delay to space out speech
+            time.sleep(WORD_CUE_SECONDS)  # Small delay to space out speech
 
-            # Stop haptics after each word
-            for dot in devices:
-                dot.registers.set_vibration_intensity(0.0)
-                dot.set_led(255, 255, 255)
+            # Reset the LEDs after each word, the vibration cue ends by itself
+            with io_priority(PRIORITY_HIGH):
+                devices.set_led(255, 255, 255)
 
         tts_running = False  # Mark speech as completed
 
-# Start TTS worker thread
-tts_thread = threading.Thread(target=tts_worker, daemon=True)
-tts_thread.start()
+def start_tts_worker():
+    """ Start the TTS worker thread, once. """
+    global tts_thread
+    with tts_thread_lock:
+        if tts_thread is None:
+            tts_thread = threading.Thread(target=tts_worker, name="tts", daemon=True)
+            tts_thread.start()
 
 @app.route("/speak-haptic", methods=["POST"])
 def speak_haptic():
@@ -392,8 +581,37 @@ def speak_haptic():
         return jsonify({"error": "⚠️ No text provided."}), 400
 
     print(f"📢 Reading: {text}")
-    tts_queue.put(text)  # Add text to queue
+    start_tts_worker()
+    tts_queue.put((text, highlights_for(*annotation_scope(data))))  # Add text to queue
     return jsonify({"message": "🔊 Reading aloud with haptic feedback."})
 
+def create_app():
+    """
+    Start the services the routes use and get the app. Call it once, in the process serving requests (e.g.
+    pythonCode:create_app() for a WSGI server).
+    """
+    global sentiment_pool, annotation_db, dot_registry, effect_scheduler, telemetry_sampler
+    if sentiment_pool is not None:
+        return app
+
+    # The workers share one memory-mapped copy of the lexicon and synonym data if it was compiled (python sentiment_pool.py)
+    sentiment_pool = SentimentPool(EMOTION_KEYWORDS, SENTIMENT_WORKERS, SENTIMENT_MAX_PENDING, SENTIMENT_TIMEOUT,
+                                   lexicon_path=COMPILED_LEXICON)
+
+    # warm start: everything saved before comes back with one query, without replaying any haptics (the scopes are
+    # ordered by their latest update, so the most recently updated ones stay in memory)
+    annotation_db = AnnotationDatabase(ANNOTATION_DB, HAPTIC_PROFILES)
+    for scope, saved in annotation_db.load_all().items():
+        store = HighlightStore(HIGHLIGHT_CAPACITY)
+        store.load(saved)
+        highlight_stores.put(scope, store)
+
+    dot_registry = DotRegistry(MAX_DOT_ADDRESS, cache_path=DISCOVERY_CACHE)
+    dot_registry.discover()
+    effect_scheduler = EffectScheduler()
+    telemetry_sampler = TelemetrySampler(dot_registry.dots, TELEMETRY_INTERVAL, TELEMETRY_SAMPLES)
+    telemetry_sampler.start()
+    return app
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
+    create_app().run(host="0.0.0.0", port=5000)
@@ -0,0 +1,370 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from math import ceil
+from typing import Callable, Dict, List, Optional, Tuple
+
+from emotion_lexicon import CompiledLexicon, EmotionLexicon, EmotionMatrix, LRUCache, compile_lexicon
+
+TOKEN_CACHE_ENTRIES = 100000  # lemmas and synonym expansions of recently seen tokens, per process
+COMPILED_LEXICON = "emotion_lexicon.bin"  # written by: python sentiment_pool.py
+
+# NLTK data the pipeline needs: download name -> nltk.data paths, any of which will do (punkt_tab replaced punkt in
+# NLTK 3.8.2). It is looked up locally only (NLTK_DATA and the default data directories), never downloaded.
+NLTK_DATA = {"wordnet": ("corpora/wordnet",), "punkt_tab": ("tokenizers/punkt_tab", "tokenizers/punkt")}
+
+# state of the process running the pipeline, set up once by init_worker; NLTK is imported there, not at startup
+_lexicon: Optional[EmotionLexicon] = None
+_matrix: Optional[EmotionMatrix] = None
+_lemmatizer = None
+_lemma_cache: Optional[LRUCache] = None
+_word_tokenize = None
+_error: Optional[str] = None
+_stats_barrier = None
+
+
+def missing_nltk_data() -> List[str]:
+    """
+    Get the download names of the NLTK data that is not installed locally.
+    """
+    import nltk.data
+    missing = []
+    for name, paths in NLTK_DATA.items():
+        for path in paths:
+            try:
+                nltk.data.find(path)
+                break
+            except LookupError:
+                pass
+        else:
+            missing.append(name)
+    return missing
+
+
+def get_synonyms(word):
+    """Find synonyms using WordNet to increase emotion detection accuracy."""
+    from nltk.corpus import wordnet
+    synonyms = set()
+    for syn in wordnet.synsets(word):
+        for lemma in syn.lemmas():
+            synonyms.add(lemma.name().lower())
+    return list(synonyms)
+
+
+def init_worker(keywords: Dict[str, List[str]], token_cache_entries: int = TOKEN_CACHE_ENTRIES,
+                lexicon_path: str = None, stats_barrier=None):
+    """
+    Load the emotion lexicon, WordNet and the tokenizer models of this process up front, so its first note is
+    analyzed as fast as later ones. If anything is missing, every analysis raises a LookupError telling what.
+
+    The lexicon is mapped from the compiled lexicon at lexicon_path if there is one (shared by all processes), and
+    otherwise built from the nrclex lexicon. stats_barrier is shared by the workers of a SentimentPool, see
+    SentimentPool.cache_stats.
+    """
+    global _lexicon, _matrix, _lemmatizer, _lemma_cache, _word_tokenize, _error, _stats_barrier
+    _stats_barrier = stats_barrier
+    missing = missing_nltk_data()
+    if missing:
+        _error = (f"NLTK data not found: {', '.join(missing)}. Install it in a directory listed in NLTK_DATA, "
+                  f"e.g. with: python -m nltk.downloader {' '.join(missing)}")
+        return
+    try:
+        from nltk.stem import WordNetLemmatizer
+        from nltk.tokenize import word_tokenize
+        _lemmatizer = WordNetLemmatizer()
+        _lemma_cache = LRUCache(max_entries=token_cache_entries)
+        _word_tokenize = word_tokenize
+        if lexicon_path and os.path.exists(lexicon_path):
+            _lexicon = CompiledLexicon(lexicon_path, keywords, get_synonyms, synonym_cache_entries=token_cache_entries)
+        else:
+            _lexicon = EmotionLexicon.load(keywords, get_synonyms, synonym_cache_entries=token_cache_entries)
+        _matrix = EmotionMatrix(_lexicon)
+        get_synonyms(_lemmatizer.lemmatize("feelings"))
+        word_tokenize("Warming up.")
+    except (LookupError, OSError, ValueError) as e:
+        _error = str(e)
+
+
+def _check():
+    if _error is not None:
+        raise LookupError(_error)
+
+
+def lemmatize(token: str) -> str:
+    """ Lemmatize a token, remembering recent tokens. """
+    lemma = _lemma_cache.get(token)
+    if lemma is None:
+        lemma = _lemmatizer.lemmatize(token)
+        _lemma_cache.put(token, lemma)
+    return lemma
+
+
+def analyze_note(text: str):
+    """
+    Get the dominant emotion of a note (stripped, lower case) and the NRC emotion scores it was picked from (empty if a
+    keyword decided).
+    """
+    _check()
+    return _lexicon.classify([lemmatize(word) for word in _word_tokenize(text)])
+
+
+def analyze_notes(texts: List[str], with_scores: bool = False):
+    """
+    Classify many notes at once, like analyze_note. Scores are only computed (otherwise None) with with_scores.
+    """
+    _check()
+    return _matrix.classify([[lemmatize(word) for word in _word_tokenize(text)] for text in texts], with_scores)
+
+
+def _ready():
+    _check()
+    return True
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Get the statistics of the token caches of this process by cache name (none before init_worker set it up).
+    """
+    if _lexicon is None:
+        return {}
+    caches = {"lemma": _lemma_cache, "synonym": _lexicon.synonym_cache}
+    if isinstance(_lexicon, CompiledLexicon):
+        caches["word"] = _lexicon.word_cache
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def _worker_cache_stats(timeout: float):
+    # every worker of the pool gets one of these calls: none answers before all of them have picked theirs up
+    try:
+        _stats_barrier.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass  # some worker is busy, answer anyway
+    return os.getpid(), cache_stats()
+
+
+def _sum_stats(all_stats: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    total = {}
+    for stats in all_stats:
+        for name, cache in stats.items():
+            summed = total.setdefault(name, {"entries": 0, "bytes": 0, "hits": 0, "misses": 0})
+            for stat in summed:
+                summed[stat] += cache[stat]
+    for summed in total.values():
+        lookups = summed["hits"] + summed["misses"]
+        summed["hit_rate"] = summed["hits"] / lookups if lookups else 0.0
+    return total
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class PoolBusy(Exception):
+    """
+    Raised when a SentimentPool already has as many analyses waiting or running as it accepts.
+    """
+
+
+class SentimentPool:
+    """
+    Runs the NLP pipeline (analyze_note and analyze_notes) in worker processes set up by init_worker, so CPU-bound
+    analyses neither hold the GIL of the web server nor delay the I/O, haptic effect and speech threads.
+
+    At most max_pending analyses are queued or running at once; further calls raise PoolBusy right away instead of
+    piling up. A call waits at most timeout seconds for its result and then raises TimeoutError (the analysis itself
+    runs to completion in its worker and keeps its slot until then). With workers=0 the pipeline runs in the calling
+    thread instead, without limits.
+
+    Creating the pool does not wait for the workers to warm up (see ready); until then, analyses wait for them. Worker
+    processes are started with forkserver (spawn where there is none), never forked from the calling process, so the
+    pool can be created and restarted while other threads run. They import the __main__ module again, which must
+    therefore start nothing at import time.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], workers: int = None, max_pending: int = 32,
+                 timeout: float = 5.0, token_cache_entries: int = TOKEN_CACHE_ENTRIES, lexicon_path: str = None):
+        self.workers = max(1, (os.cpu_count() or 2) - 1) if workers is None else workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self._initargs = (keywords, token_cache_entries, lexicon_path)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._worker_stats = {}  # latest cache_stats by worker process id
+        self._stats_lock = threading.Lock()
+        self._stats_barrier = _mp_context().Barrier(self.workers) if self.workers else None
+        if self.workers:
+            self._start()
+        else:
+            self._warmup = [Future()]
+            threading.Thread(target=self._warm_up, name="sentiment-warmup", daemon=True).start()
+
+    def _start(self):
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=_mp_context(), initializer=init_worker,
+                                             initargs=self._initargs + (self._stats_barrier,))
+        # start the workers now, not on the first note
+        self._warmup = [self._executor.submit(_ready) for _ in range(self.workers)]
+
+    def _warm_up(self):
+        init_worker(*self._initargs)
+        try:
+            self._warmup[0].set_result(_ready())
+        except LookupError as e:
+            self._warmup[0].set_exception(e)
+
+    def ready(self) -> bool:
+        """
+        Check whether the workers are warmed up and can analyze notes.
+        """
+        return all(future.done() and not future.cancelled() and future.exception() is None for future in self._warmup)
+
+    def error(self) -> Optional[str]:
+        """
+        Get the reason the workers cannot analyze notes (e.g. missing NLTK data), or None.
+        """
+        for future in self._warmup:
+            if future.done() and not future.cancelled() and future.exception() is not None:
+                return str(future.exception())
+        return None
+
+    def analyze_note(self, text: str, timeout: float = None):
+        """
+        Get the dominant emotion of a note and its emotion scores, see analyze_note.
+        """
+        return self._run(analyze_note, [(text,)], timeout)[0]
+
+    def analyze_notes(self, texts: List[str], with_scores: bool = False, timeout: float = None):
+        """
+        Classify many notes, split across the workers, see analyze_notes.
+        """
+        if not texts:
+            return []
+        size = ceil(len(texts) / max(1, min(self.workers, self.max_pending)))
+        chunks = [(texts[i:i + size], with_scores) for i in range(0, len(texts), size)]
+        return [result for chunk in self._run(analyze_notes, chunks, timeout) for result in chunk]
+
+    def cache_stats(self, timeout: float = 1.0) -> Dict[str, Dict[str, float]]:
+        """
+        Get the statistics of the token caches (see cache_stats) summed over the worker processes. Workers that do not
+        answer within timeout, e.g. while analyzing a long batch, count with the statistics they reported last.
+        """
+        if self._executor is None:
+            return cache_stats()
+        with self._stats_lock:
+            self._stats_barrier.reset()
+            try:
+                futures = [self._executor.submit(_worker_cache_stats, timeout) for _ in range(self.workers)]
+            except BrokenProcessPool:
+                futures = []
+            done, _ = wait(futures, 2 * timeout)
+            for future in done:
+                if future.exception() is None:
+                    pid, stats = future.result()
+                    self._worker_stats[pid] = stats
+            return _sum_stats(list(self._worker_stats.values()))
+
+    def pending(self) -> int:
+        """
+        Get the number of analyses queued or running.
+        """
+        with self._lock:
+            return self._pending
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _acquire(self, slots: int) -> bool:
+        for acquired in range(slots):
+            if not self._slots.acquire(blocking=False):
+                for _ in range(acquired):
+                    self._slots.release()
+                return False
+        with self._lock:
+            self._pending += slots
+        return True
+
+    def _release(self, _=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _run(self, fn: Callable, calls: List[Tuple], timeout: Optional[float]) -> List:
+        if self._executor is None:
+            self._warmup[0].result(self.timeout if timeout is None else timeout)
+            return [fn(*args) for args in calls]
+        if not self._acquire(len(calls)):
+            with self._lock:
+                self.rejected += 1
+            raise PoolBusy(f"{self.max_pending} analyses are already waiting")
+
+        futures = []
+        try:
+            for args in calls:
+                future = self._executor.submit(fn, *args)
+                future.add_done_callback(self._release)
+                futures.append(future)
+        except BrokenProcessPool:
+            for _ in range(len(calls) - len(futures)):
+                self._release()
+            self._restart()
+            raise
+
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        try:
+            return [future.result(max(0.0, deadline - time.monotonic())) for future in futures]
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            for future in futures:
+                future.cancel()  # not started yet; running ones finish in the background
+            raise
+        except BrokenProcessPool:
+            self._restart()
+            raise
+
+    def _restart(self):
+        """
+        Replace the executor after a worker process died, which breaks it for good.
+        """
+        with self._lock:
+            broken = self._executor
+            if broken is None or not broken._broken:
+                return
+            print("Sentiment worker died, restarting the pool")
+            self._worker_stats = {}
+            self._start()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+def build_lexicon(path: str = COMPILED_LEXICON):
+    """
+    Compile the NRC lexicon and the WordNet synonym expansion of every WordNet lemma name into path, see
+    compile_lexicon. Needs the NLTK data, like the workers.
+    """
+    missing = missing_nltk_data()
+    if missing:
+        raise LookupError(f"NLTK data not found: {', '.join(missing)}")
+    from nltk.corpus import wordnet
+    compile_lexicon(path, wordnet.all_lemma_names(), get_synonyms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the emotion lexicon shared by the sentiment workers.")
+    parser.add_argument("--output", default=COMPILED_LEXICON)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    build_lexicon(args.output)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) in {time.perf_counter() - start:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
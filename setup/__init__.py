@@ -1,4 +1,5 @@
-from .device import discover_devices, LedMode
-
-__all__ = ["discover_devices", "LedMode"]
+from .device import compile_write_frame, discover_devices, io_priority, DotGroup, DotRegistry, LedMode, PortWorker
+from .effects import EffectScheduler, LedAnimator, compile_vibration_sequence, gradient_frame, play_haptic, revert_haptic
+from .telemetry import RingBuffer, TelemetrySampler
 
+__all__ = ["compile_write_frame", "discover_devices", "io_priority", "DotGroup", "DotRegistry", "EffectScheduler", "compile_vibration_sequence", "gradient_frame", "LedAnimator", "LedMode", "play_haptic", "PortWorker", "revert_haptic", "RingBuffer", "TelemetrySampler"]
@@ -0,0 +1,199 @@
+"""
+Benchmarks of the device layer: Modbus transactions, bytes on the wire and wall time per operation.
+
+Every operation drives the effect helpers of an app path (the haptic effects of /haptic-feedback, /analyze-sentiment,
+/replay-haptic and the TTS word cues, discovery and telemetry), without the pauses between effect steps. By default
+the Dots are simulated (see datafeel.simulator); pass --ports to measure real hardware. Results are printed as JSON:
+
+    python -m datafeel.bench --iterations 100 --latency 0.002 > bench.json
+"""
+import argparse
+from contextlib import redirect_stdout
+import json
+import sys
+import threading
+import time
+from math import ceil
+from typing import Callable, Dict, List
+
+from .device import DotGroup, discover_devices
+from .effects import LED_NEUTRAL, WORD_CUE_SECONDS, compile_vibration_sequence, play_haptic, revert_haptic
+
+# two alternating emotions (anger and joy of the app), so repeated iterations are not all absorbed by the register cache
+EFFECTS = [
+    {"led": (255, 0, 0), "vibration": 200, "temperature": 40.0, "intensity": 1.0},
+    {"led": (0, 255, 0), "vibration": 100, "temperature": 28.0, "intensity": 0.6},
+]
+
+
+class WireCounter:
+    """
+    Counts the frames (one write per Modbus request) and bytes going over serial ports, by wrapping their read and
+    write methods.
+    """
+
+    def __init__(self):
+        self.transactions = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._ports = set()
+        self._lock = threading.Lock()
+
+    def attach(self, port):
+        if id(port) in self._ports:
+            return
+        self._ports.add(id(port))
+        write, read = port.write, port.read
+
+        def counted_write(data):
+            with self._lock:
+                self.transactions += 1
+                self.bytes_sent += len(data)
+            return write(data)
+
+        def counted_read(size=1):
+            data = read(size)
+            with self._lock:
+                self.bytes_received += len(data)
+            return data
+
+        port.write = counted_write
+        port.read = counted_read
+
+    def snapshot(self):
+        with self._lock:
+            return self.transactions, self.bytes_sent, self.bytes_received
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, ceil(q * len(ordered)) - 1))]
+
+
+def _play_haptic(group: DotGroup, effect, intensity=None):
+    play_haptic(group, effect["led"], effect["vibration"], effect["intensity"] if intensity is None else intensity,
+                effect["temperature"])
+
+
+def operations(max_address: int, ports: List[str]) -> Dict[str, Callable]:
+    """
+    Get the benchmarked operations by name. Each takes the group of Dots and the iteration number.
+    """
+    def haptic_feedback(group, i):
+        _play_haptic(group, EFFECTS[i % 2])
+        revert_haptic(group)
+
+    def analyze_sentiment(group, i):
+        _play_haptic(group, EFFECTS[i % 2], 1)
+        _play_haptic(group, EFFECTS[i % 2])
+        revert_haptic(group)
+
+    def replay_haptic(group, i):
+        _play_haptic(group, EFFECTS[i % 2])
+        revert_haptic(group, reset_temperature=False)
+
+    def tts_word_cue(group, i):
+        group.set_led(*EFFECTS[i % 2]["led"])
+        group.play_vibration_sequence(compile_vibration_sequence(EFFECTS[i % 2]["vibration"], 1.0, WORD_CUE_SECONDS))
+        group.set_led(*LED_NEUTRAL)
+
+    def read_telemetry(group, i):
+        for dot in group:
+            dot.read_telemetry()
+
+    def led_frame(group, i):
+        group.set_led_frame([(i % 256, (i * 7) % 256, (i * 13 + k) % 256) for k in range(8)])
+
+    def discovery(group, i):
+        discover_devices(max_address, ports=ports)
+
+    return {"haptic_feedback": haptic_feedback, "analyze_sentiment": analyze_sentiment,
+            "replay_haptic": replay_haptic, "tts_word_cue": tts_word_cue, "read_telemetry": read_telemetry,
+            "led_frame": led_frame, "discovery": discovery}
+
+
+def run(ports: List[str], max_address: int, iterations: int, only: List[str] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Run the benchmarks against the Dots on ports and get the results per operation: mean transactions and bytes per
+    run, and p50/p99/mean wall time in milliseconds. The first run of every operation is a warm-up and not counted.
+    """
+    dots = discover_devices(max_address, ports=ports)
+    if not dots:
+        raise RuntimeError(f"No dots found on {ports}")
+    for dot in dots:
+        dot.resync()
+    group = DotGroup(dots, broadcast=True)  # all Dots on the ports
+
+    counter = WireCounter()
+    for dot in dots:
+        counter.attach(dot.registers.dev.serial)
+
+    results = {}
+    for name, operation in operations(max_address, ports).items():
+        if only and name not in only:
+            continue
+        operation(group, 0)
+        before = counter.snapshot()
+        durations = []
+        for i in range(1, iterations + 1):
+            start = time.perf_counter()
+            operation(group, i)
+            durations.append(time.perf_counter() - start)
+        after = counter.snapshot()
+        transactions, bytes_sent, bytes_received = (b - a for a, b in zip(before, after))
+        results[name] = {
+            "iterations": iterations,
+            "transactions": transactions / iterations,
+            "bytes_sent": bytes_sent / iterations,
+            "bytes_received": bytes_received / iterations,
+            "p50_ms": 1000 * _percentile(durations, 0.50),
+            "p99_ms": 1000 * _percentile(durations, 0.99),
+            "mean_ms": 1000 * sum(durations) / iterations,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the DataFeel device layer.")
+    parser.add_argument("--ports", default=None, help="comma separated serial ports of real Dots (default: simulate)")
+    parser.add_argument("--dots", type=int, default=4, help="number of simulated Dots")
+    parser.add_argument("--max-address", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--operations", default=None, help="comma separated operations to run (default: all)")
+    parser.add_argument("--baudrate", type=int, default=115200, help="simulated baud rate")
+    parser.add_argument("--latency", type=float, default=0.001, help="simulated processing time per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="simulated maximum random extra latency in seconds")
+    parser.add_argument("--output", default=None, help="write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+    only = args.operations.split(",") if args.operations else None
+
+    environment = {"iterations": args.iterations, "max_address": args.max_address}
+    with redirect_stdout(sys.stderr):  # keep the discovery log out of the JSON report
+        results = _run_environment(args, environment, only)
+
+    report = json.dumps({"environment": environment, "operations": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+def _run_environment(args, environment, only):
+    if args.ports:
+        environment.update(simulated=False, ports=args.ports.split(","))
+        results = run(environment["ports"], args.max_address, args.iterations, only)
+    else:
+        # the simulator runs on pseudo-terminals, which only exist on Unix; real ports work everywhere
+        from .simulator import DotSimulator, SimulatedDot
+        simulator = DotSimulator([SimulatedDot(address) for address in range(1, args.dots + 1)], args.baudrate,
+                                 args.latency, args.jitter)
+        environment.update(simulated=True, dots=args.dots, baudrate=args.baudrate, latency=args.latency,
+                           jitter=args.jitter)
+        with simulator:
+            results = run([simulator.port], args.max_address, args.iterations, only)
+    return results
+
+
+if __name__ == "__main__":
+    main()
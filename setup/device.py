@@ -1,14 +1,53 @@
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from math import ceil
-from typing import List
+from typing import Dict, List, Tuple
+import heapq
+import itertools
+import json
+import os
+import struct
+import threading
+import time
 #pip install serial
 import serial
 import serial.tools.list_ports
 import minimalmodbus as modbus
 from enum import IntEnum
 
+from .metrics import bus_metrics
+
 def _fix_string_endianness(string):
     return ''.join(string[i:i+2][::-1] for i in range(0, len(string), 2))
 
+# 32-bit values are stored in two registers with BYTEORDER_LITTLE_SWAP: low word first, each word big-endian
+def _long_to_registers(value) -> List[int]:
+    value = int(value) & 0xFFFFFFFF
+    return [value & 0xFFFF, value >> 16]
+
+def _float_to_registers(value) -> List[int]:
+    return _long_to_registers(struct.unpack('<I', struct.pack('<f', value))[0])
+
+def _registers_to_long(registers) -> int:
+    return registers[0] | (registers[1] << 16)
+
+def _registers_to_float(registers) -> float:
+    return struct.unpack('<f', struct.pack('<I', _registers_to_long(registers)))[0]
+
+def _contiguous_runs(words: Dict[int, int]):
+    """
+    Split a {register address: word} mapping into (start address, [words]) runs of consecutive addresses.
+    """
+    runs = []
+    for address in sorted(words):
+        if runs and runs[-1][0] + len(runs[-1][1]) == address:
+            runs[-1][1].append(words[address])
+        else:
+            runs.append((address, [words[address]]))
+    return runs
+
 class VibrationWaveforms(IntEnum):
     END_SEQUENCE = 0
     STRONG_CLICK_P100 = 1
@@ -161,6 +200,235 @@ class ThermalMode(IntEnum):
     TEMPERATURE_TARGET = 2
 
 
+def _make_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC_TABLE = _make_crc_table()
+
+def _crc16(data: bytes) -> bytes:
+    """
+    Modbus RTU CRC of data, low byte first as sent on the wire.
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return struct.pack('<H', crc)
+
+@lru_cache(maxsize=4096)
+def compile_write_frame(address: int, start: int, words: Tuple[int, ...]) -> Tuple[bytes, bytes]:
+    """
+    Compile a write-multiple-registers (function 16) request for the slave at address into ready-to-send RTU bytes,
+    together with the exact response expected from the slave (empty for the broadcast address 0). Frames are cached,
+    so the fixed states of haptic effects are only encoded once.
+    """
+    body = struct.pack('>BBHHB', address, 16, start, len(words), 2 * len(words)) + struct.pack(f'>{len(words)}H', *words)
+    request = body + _crc16(body)
+    if address == 0:
+        return request, b''
+    header = struct.pack('>BBHH', address, 16, start, len(words))
+    return request, header + _crc16(header)
+
+def _silent_period(baudrate) -> float:
+    # 3.5 character times between RTU frames, but at least 1.75 ms as the Modbus spec fixes it above 19200 baud
+    return max(3.5 * 11 / baudrate, 0.00175)
+
+# reads are idempotent, so a read that times out or gets a corrupt answer is tried again this many times
+READ_RETRIES = 1
+
+# fields of Dot.read_telemetry, in register order
+TELEMETRY_FIELDS = ("skin_temperature", "sink_temperature", "mcu_temperature", "gate_driver_temperature", "thermal_power")
+
+# I/O priorities, lower runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_io_context = threading.local()
+
+@contextmanager
+def io_priority(priority: int):
+    """
+    Run the Modbus transactions issued by the current thread inside the with block at the given priority.
+    """
+    previous = getattr(_io_context, "priority", PRIORITY_NORMAL)
+    _io_context.priority = priority
+    try:
+        yield
+    finally:
+        _io_context.priority = previous
+
+
+def _overlaps(key, other) -> bool:
+    """
+    Check whether two write keys (slave address, first register, register count) touch the same registers of a Dot.
+    """
+    address, start, count = key
+    other_address, other_start, other_count = other
+    same_slave = address == other_address or address == 0 or other_address == 0  # 0 is broadcast
+    return same_slave and start < other_start + other_count and other_start < start + count
+
+
+class PortWorker:
+    """
+    Owns one serial port. All Modbus transactions for the Dots on the port run on this worker's thread, one at a time, so
+    frames from different threads never interleave.
+
+    Commands are queued by priority (see io_priority). A write queued with the same key as a pending write (same slave
+    and registers) replaces it, so only the latest value goes out; it takes the replaced write's place in the queue
+    unless an overlapping write was queued since. A write never overtakes a pending write to overlapping registers: the
+    older one is promoted to the newer one's priority.
+    """
+
+    _workers = {}
+    _workers_lock = threading.Lock()
+
+    @classmethod
+    def for_port(cls, port) -> "PortWorker":
+        """
+        Get the running worker of a port, starting one if needed.
+        """
+        with cls._workers_lock:
+            worker = cls._workers.get(port)
+            if worker is None or not worker.running:
+                worker = cls._workers[port] = cls(port)
+            return worker
+
+    def __init__(self, port):
+        self.port = port
+        self.running = True
+        self.last_frame_time = 0.0
+        self.silent_period = 0.0
+        self._heap = []
+        self._pending = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._broadcast_registers = None
+        self._thread = threading.Thread(target=self._run, name=f"modbus-{port}", daemon=True)
+        self._thread.start()
+
+    def broadcast_registers(self) -> "Dot.V63Registers":
+        """
+        Get the registers of the broadcast address 0 of the port, shared by every DotGroup writing to it. They are
+        created on the worker thread, as creating them configures the shared serial port.
+        """
+        with self._cond:
+            registers = self._broadcast_registers
+        if registers is None:
+            registers = self.call(Dot.V63Registers, self.port, DotGroup.BROADCAST_ADDRESS)
+            with self._cond:
+                if self._broadcast_registers is None:
+                    self._broadcast_registers = registers
+                registers = self._broadcast_registers
+        return registers
+
+    def submit(self, fn, *args, key=None, priority: int = None) -> Future:
+        """
+        Queue fn(*args) to run on the worker thread. key is (slave address, first register, register count) for writes
+        that may be coalesced, or None. The priority defaults to the one set with io_priority.
+        """
+        if priority is None:
+            priority = getattr(_io_context, "priority", PRIORITY_NORMAL)
+        future = Future()
+        with self._cond:
+            if not self.running:
+                raise RuntimeError(f"I/O worker of port {self.port} is stopped")
+            futures = [future]
+            sequence = next(self._counter)
+            if key is not None:
+                previous = self._pending.get(key)
+                if previous is not None:
+                    # latest value wins, keeping the older command's place in the queue unless that would move it ahead
+                    # of an overlapping write queued after the older command
+                    previous[5] = True
+                    futures = previous[4] + futures
+                    priority = min(priority, previous[0])
+                    if not any(entry[1] > previous[1] for other, entry in self._pending.items()
+                               if other != key and _overlaps(key, other)):
+                        sequence = previous[1]
+                self._promote_overlapping(key, priority)
+            entry = [priority, sequence, key, (fn, args), futures, False]
+            if key is not None:
+                self._pending[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._cond.notify()
+        return future
+
+    def _promote_overlapping(self, key, priority):
+        for other, entry in list(self._pending.items()):
+            if other != key and _overlaps(key, other) and entry[0] > priority:
+                entry[5] = True
+                promoted = [priority, entry[1], other, entry[3], entry[4], False]
+                self._pending[other] = promoted
+                heapq.heappush(self._heap, promoted)
+
+    def call(self, fn, *args, key=None, priority: int = None):
+        """
+        Run fn(*args) on the worker thread and wait for its result.
+        """
+        return self.submit(fn, *args, key=key, priority=priority).result()
+
+    @classmethod
+    def workers(cls) -> List["PortWorker"]:
+        """
+        Get the workers of all ports.
+        """
+        with cls._workers_lock:
+            return list(cls._workers.values())
+
+    def depth(self) -> int:
+        """
+        Get the number of queued commands.
+        """
+        with self._cond:
+            return sum(1 for entry in self._heap if not entry[5])
+
+    def stop(self):
+        """
+        Stop the worker after the queued commands have run.
+        """
+        with self._cond:
+            self.running = False
+            self._cond.notify()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap and self.running:
+                    self._cond.wait()
+                if not self._heap:
+                    return
+                entry = heapq.heappop(self._heap)
+                if entry[5]:
+                    continue  # superseded by a newer write or promoted
+                if entry[2] is not None:
+                    del self._pending[entry[2]]
+
+            # raw frames bypass minimalmodbus' own bookkeeping, so keep the inter-frame silence for every command here
+            wait = self.last_frame_time + self.silent_period - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            fn, args = entry[3]
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                self.last_frame_time = time.monotonic()
+                for future in entry[4]:
+                    future.set_exception(e)
+            else:
+                self.last_frame_time = time.monotonic()
+                for future in entry[4]:
+                    future.set_result(result)
+
+
 class Dot:
     class V63Registers():
         # RO
@@ -199,6 +467,40 @@ class Dot:
         VIBRATION_SEQUENCE_0123 = 1044
         VIBRATION_SEQUENCE_4567 = 1046
 
+        # how each RW register pair is encoded, used to pack several of them into one write-multiple-registers frame
+        LONG = 'long'
+        FLOAT = 'float'
+        REGISTER_TYPES = {
+            LED_MODE: LONG,
+            GLOBAL_MANUAL: LONG,
+            LED_INDIVIDUAL_MANUAL_0: LONG,
+            LED_INDIVIDUAL_MANUAL_1: LONG,
+            LED_INDIVIDUAL_MANUAL_2: LONG,
+            LED_INDIVIDUAL_MANUAL_3: LONG,
+            LED_INDIVIDUAL_MANUAL_4: LONG,
+            LED_INDIVIDUAL_MANUAL_5: LONG,
+            LED_INDIVIDUAL_MANUAL_6: LONG,
+            LED_INDIVIDUAL_MANUAL_7: LONG,
+            THERMAL_MODE: LONG,
+            THERMAL_INTENSITY: FLOAT,
+            THERMAL_SKIN_TEMP_TARGET: FLOAT,
+            VIBRATION_MODE: LONG,
+            VIBRATION_FREQUENCY: FLOAT,
+            VIBRATION_INTENSITY: FLOAT,
+            VIBRATION_GO: LONG,
+            VIBRATION_SEQUENCE_0123: LONG,
+            VIBRATION_SEQUENCE_4567: LONG,
+        }
+
+        # writing these triggers an action every time, so they are never suppressed by the shadow cache
+        VOLATILE_REGISTERS = {VIBRATION_GO}
+
+        # seconds to wait after a broadcast frame, which no slave acknowledges
+        BROADCAST_DELAY = 0.01
+
+        # write plans of submit_values kept per Dot, see _plan
+        PLAN_CACHE_ENTRIES = 256
+
         def __init__(self, port, id):
             self.dev = modbus.Instrument(port, id, modbus.MODE_RTU)
             self.dev.serial.baudrate = 115200
@@ -206,84 +508,326 @@ class Dot:
             self.dev.serial.parity = serial.PARITY_NONE
             self.dev.serial.stopbits = 1
 
+            # all transactions on the port go through its I/O worker
+            self.worker = PortWorker.for_port(port)
+            self.worker.silent_period = _silent_period(self.dev.serial.baudrate)
+
+            # write-through shadow of the RW registers, {register address: 16-bit word}
+            self.shadow = {}
+            self.cache_hits = 0
+            self.cache_misses = 0
+            self._plans = OrderedDict()
+            # writes begun so far, the number of the latest one to each register and the registers with writes queued,
+            # so read-back words never replace newer shadowed values (see _stale)
+            self._writes = 0
+            self._last_write = {}
+            self._queued_writes = Counter()
+            self._lock = threading.RLock()
+
+        def call(self, fn, *args, key=None, register=None, operation="read", retries=0):
+            """
+            Run a minimalmodbus call of this Dot on the port's I/O worker and wait for its result. The transaction is
+            recorded in bus_metrics under register and operation; after a timeout or an invalid response it is retried up
+            to retries times.
+            """
+            return self.worker.call(self._transaction, fn, args, register, operation, retries, key=key)
+
+        def _transaction(self, fn, args, register, operation, retries):
+            """
+            Run fn(*args) on the I/O worker thread, recording its duration and outcome.
+            """
+            labels = (self.worker.port, self.dev.address, _REGISTER_NAMES.get(register, register or ""), operation)
+            for attempt in range(retries + 1):
+                start = time.perf_counter()
+                try:
+                    result = fn(*args)
+                except Exception as e:
+                    bus_metrics.record(*labels, time.perf_counter() - start, _outcome(e))
+                    if attempt < retries and isinstance(e, (modbus.NoResponseError, modbus.InvalidResponseError)):
+                        bus_metrics.retry(*labels)
+                        continue
+                    raise
+                bus_metrics.record(*labels, time.perf_counter() - start)
+                return result
+
+        def encode(self, values: Dict[int, object]) -> Dict[int, int]:
+            """
+            Encode {register address: value} for RW registers into {register address: 16-bit word}.
+            """
+            words = {}
+            for address, value in values.items():
+                if self.REGISTER_TYPES[address] == self.FLOAT:
+                    pair = _float_to_registers(value)
+                else:
+                    pair = _long_to_registers(value)
+                words[address] = pair[0]
+                words[address + 1] = pair[1]
+            return words
+
+        def write_values(self, values: Dict[int, object], wait: bool = True):
+            """
+            Write several RW registers, given as {register address: value}. Values the Dot already holds according to the
+            shadow cache are skipped. The rest is packed into as few write-multiple-registers (function 16) transactions
+            as possible, filling gaps between them from the shadow cache. Returns the {register address: word} written.
+
+            With wait=False the writes are only queued on the port's I/O worker. The shadow cache is updated right away
+            and invalidated again if a write fails.
+            """
+            written, futures = self.submit_values(values)
+            if wait:
+                for future in futures:
+                    future.result()
+            return written
+
+        def submit_values(self, values: Dict[int, object]):
+            """
+            Queue the writes of write_values on the port's I/O worker without waiting. Returns the {register address: word}
+            written and the futures of the queued transactions.
+            """
+            written = {}
+            futures = []
+            with self._lock:
+                hits, writes = self._plan(values)
+                self.cache_hits += hits
+                self.cache_misses += len(values) - hits
+                for start, run, frame in writes:
+                    span = range(start, start + len(run))
+                    # shadow first: a write failing before its callback is attached invalidates it right away
+                    self._begin_write(dict(zip(span, run)))
+                    written.update(zip(span, run))
+                    try:
+                        future = self.worker.submit(self._transaction, self.send_frame, frame, start, "write", 0,
+                                                    key=(self.dev.address, start, len(run)))
+                    except RuntimeError:
+                        self._end_write(span, failed=True)
+                        raise
+                    future.add_done_callback(lambda f, span=span: self._end_write(span, f.exception() is not None))
+                    futures.append(future)
+            return written, futures
+
+        def _plan(self, values: Dict[int, object]):
+            """
+            Get the number of values the shadow cache already holds and the writes of submit_values, as [(first register,
+            words, frame)]. A plan only depends on the values and the shadowed words of the registers they span, so it is
+            cached by both: repeating a state costs no float packing, run merging or frame building.
+            """
+            if not values:
+                return 0, []
+            key = (tuple(values.items()), tuple(self.shadow.get(a) for a in range(min(values), max(values) + 2)))
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+
+            hits = 0
+            words = {}
+            for address, pair in self._pairs(self.encode(values)).items():
+                if address not in self.VOLATILE_REGISTERS and all(self.shadow.get(a) == w for a, w in pair.items()):
+                    hits += 1
+                else:
+                    words.update(pair)
+            writes = [(start, tuple(run), compile_write_frame(self.dev.address, start, tuple(run)))
+                      for start, run in self._fill_gaps(_contiguous_runs(words))]
+            plan = self._plans[key] = (hits, writes)
+            if len(self._plans) > self.PLAN_CACHE_ENTRIES:
+                self._plans.popitem(last=False)
+            return plan
+
+        def send_frame(self, request: bytes, response: bytes):
+            """
+            Send a frame compiled by compile_write_frame and check that the slave answers with exactly the expected
+            response. Must run on the port's I/O worker.
+            """
+            port = self.dev.serial
+            port.reset_input_buffer()
+            port.write(request)
+            if not response:
+                # broadcast: nobody answers, give the slaves time to apply it
+                port.flush()
+                time.sleep(self.BROADCAST_DELAY)
+                return
+            answer = port.read(len(response))
+            if answer != response:
+                if not answer:
+                    raise modbus.NoResponseError(f"No answer from Dot {self.dev.address} on {port.port}")
+                raise modbus.InvalidResponseError(f"Unexpected answer from Dot {self.dev.address} on {port.port}: {answer.hex()}")
+
+        def _begin_write(self, words: Dict[int, int]):
+            """
+            Shadow the {register address: word} of a write about to be queued, see _end_write.
+            """
+            with self._lock:
+                self.shadow.update(words)
+                for address in words:
+                    self._last_write[address] = self._writes
+                    self._queued_writes[address] += 1
+                self._writes += 1
+
+        def _end_write(self, addresses, failed: bool):
+            with self._lock:
+                for address in addresses:
+                    self._queued_writes[address] -= 1
+                    if not self._queued_writes[address]:
+                        del self._queued_writes[address]
+                if failed:
+                    self.invalidate(addresses)
+
+        def _stale(self, address, since: int, queued) -> bool:
+            # a word read back is older than the shadowed one if the register had a write queued when the read was
+            # queued (it may run either side of the read) or got one since
+            return address in queued or self._last_write.get(address, -1) >= since
+
+        def _read_registers(self, first: int, count: int) -> List[int]:
+            """
+            Read count registers from first, returning the words from the Dot. Shadowed registers take them on, except
+            those written while the read was in flight, whose shadowed words are newer.
+            """
+            with self._lock:
+                since, queued = self._writes, set(self._queued_writes)
+            words = self.call(self.dev.read_registers, first, count, register=first, retries=READ_RETRIES)
+            with self._lock:
+                for address, word in zip(range(first, first + count), words):
+                    if address - address % 2 in self.REGISTER_TYPES and not self._stale(address, since, queued):
+                        self.shadow[address] = word
+            return words
+
+        def _pairs(self, words: Dict[int, int]) -> Dict[int, Dict[int, int]]:
+            pairs = {}
+            for address, word in words.items():
+                pairs.setdefault(address - address % 2, {})[address] = word
+            return pairs
+
+        def _fill_gaps(self, runs):
+            """
+            Merge runs whose gap registers are known (and not volatile), so they can be written in one frame.
+            """
+            merged = []
+            for start, run in runs:
+                if merged:
+                    prev_start, prev_run = merged[-1]
+                    gap = range(prev_start + len(prev_run), start)
+                    if all(a in self.shadow and a - a % 2 not in self.VOLATILE_REGISTERS for a in gap):
+                        prev_run.extend(self.shadow[a] for a in gap)
+                        prev_run.extend(run)
+                        continue
+                merged.append((start, list(run)))
+            return merged
+
+        def _read_long(self, address) -> int:
+            return _registers_to_long(self._read_registers(address, 2))
+
+        def _read_float(self, address) -> float:
+            return _registers_to_float(self._read_registers(address, 2))
+
+        def invalidate(self, addresses=None):
+            """
+            Forget the shadowed value of the given register addresses, or of all registers if None. Use this after a
+            communication error or when the Dot may have been reset.
+            """
+            with self._lock:
+                if addresses is None:
+                    self.shadow.clear()
+                else:
+                    for address in addresses:
+                        self.shadow.pop(address, None)
+
+        def resync(self):
+            """
+            Re-read all RW registers from the Dot in one transaction and replace the shadow cache with them, keeping the
+            shadowed words of registers written while the read was in flight.
+            """
+            first = min(self.REGISTER_TYPES)
+            count = max(self.REGISTER_TYPES) + 2 - first
+            with self._lock:
+                since, queued = self._writes, set(self._queued_writes)
+            words = self.call(self.dev.read_registers, first, count, register=first, retries=READ_RETRIES)
+            with self._lock:
+                shadow = {}
+                for address, word in zip(range(first, first + count), words):
+                    if address - address % 2 in self.VOLATILE_REGISTERS:
+                        continue
+                    if not self._stale(address, since, queued):
+                        shadow[address] = word
+                    elif address in self.shadow:
+                        shadow[address] = self.shadow[address]
+                self.shadow = shadow
+
         def get_skin_temperature(self):
             """
             Get the skin temperature in Celsius.
             """
-            return self.dev.read_float(self.SKIN_TEMP, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
-
+            return self._read_float(self.SKIN_TEMP)
         def get_sink_temperature(self):
             """
             Get the sink temperature in Celsius.
             """
-            return self.dev.read_float(self.SINK_TEMP, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)   
-
+            return self._read_float(self.SINK_TEMP)
         def get_mcu_temperature(self):
             """
             Get the MCU temperature in Celsius.
             """
-            return self.dev.read_float(self.MCU_TEMP, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
-
+            return self._read_float(self.MCU_TEMP)
         def get_gate_driver_temperature(self):
             """
             Get the gate driver temperature in Celsius.
             """
-            return self.dev.read_float(self.GATE_DRIVER_TEMP, 3, 2, modbus.BYTEORDER_LITTLE_SWAP) 
-
+            return self._read_float(self.GATE_DRIVER_TEMP)
         def get_thermal_power(self):
             """
             Get the thermal power.
             """
-            return self.dev.read_float(self.THERMAL_POWER, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
+            return self._read_float(self.THERMAL_POWER)
+        def read_telemetry(self) -> Dict[str, float]:
+            """
+            Read the temperatures and the thermal power (SKIN_TEMP through THERMAL_POWER) in one transaction.
+            """
+            words = self.call(self.dev.read_registers, self.SKIN_TEMP, self.THERMAL_POWER + 2 - self.SKIN_TEMP,
+                              register=self.SKIN_TEMP, retries=READ_RETRIES)
+            return {field: _registers_to_float(words[i * 2:i * 2 + 2]) for i, field in enumerate(TELEMETRY_FIELDS)}
 
         def set_thermal_mode(self, mode: ThermalMode):
             """
             Set the thermal mode.
             """
-            self.dev.write_long(registeraddress=self.THERMAL_MODE, value=int(mode), signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)   
-
+            self.write_values({self.THERMAL_MODE: int(mode)})
         def get_thermal_mode(self):
             """
             Get the thermal mode.
             """
-            return ThermalMode(self.dev.read_long(self.THERMAL_MODE, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2))    
+            return ThermalMode(self._read_long(self.THERMAL_MODE))    
 
         def set_thermal_intensity(self, intensity: float):
             """
             Set the thermal intensity. The intensity is a float between -1 (maximum cooling) and 1 (maximum heating).
             """
-            self.dev.write_float(registeraddress=self.THERMAL_INTENSITY, value=intensity, number_of_registers=2, byteorder=modbus.BYTEORDER_LITTLE_SWAP)
-
+            self.write_values({self.THERMAL_INTENSITY: intensity})
         def get_thermal_intensity(self):
             """
             Get the thermal intensity. The intensity is a float between -1 (maximum cooling) and 1 (maximum heating).
             """
-            return self.dev.read_float(self.THERMAL_INTENSITY, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
-
+            return self._read_float(self.THERMAL_INTENSITY)
         def set_skin_temp_target(self, temp: float):
             """
             Set the skin temperature target in Celsius.
             """
-            self.dev.write_float(registeraddress=self.THERMAL_SKIN_TEMP_TARGET, value=temp, number_of_registers=2, byteorder=modbus.BYTEORDER_LITTLE_SWAP)
-
+            self.write_values({self.THERMAL_SKIN_TEMP_TARGET: temp})
         def get_thermal_skin_temp_target(self):
             """
             Get the skin temperature target in Celsius.
             """
-            return self.dev.read_float(self.THERMAL_SKIN_TEMP_TARGET, 3)  
+            return self._read_float(self.THERMAL_SKIN_TEMP_TARGET)
 
 
         def set_vibration_mode(self, mode: VibrationMode):
             """
             Set the vibration mode.
             """
-            self.dev.write_long(registeraddress=self.VIBRATION_MODE, value=int(mode), signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.VIBRATION_MODE: int(mode)})
         def get_vibration_mode(self) -> VibrationMode:
             """
             Get the vibration mode.
             """ 
-            return VibrationMode(self.dev.read_long(self.VIBRATION_MODE, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2))
+            return VibrationMode(self._read_long(self.VIBRATION_MODE))
 
         def get_vibration_amplitude(self):
             """
@@ -295,75 +839,66 @@ class Dot:
             """
             Set the vibration frequency.
             """
-            self.dev.write_float(registeraddress=self.VIBRATION_FREQUENCY, value=frequency, number_of_registers=2, byteorder=modbus.BYTEORDER_LITTLE_SWAP)
-
+            self.write_values({self.VIBRATION_FREQUENCY: frequency})
         def get_vibration_frequency(self):
             """
             Get the vibration frequency.
             """
-            return self.dev.read_float(self.VIBRATION_FREQUENCY, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
-
+            return self._read_float(self.VIBRATION_FREQUENCY)
         def set_vibration_intensity(self, intensity: float):
             """
             Set the vibration intensity.
             """
-            self.dev.write_float(registeraddress=self.VIBRATION_INTENSITY, value=intensity, number_of_registers=2, byteorder=modbus.BYTEORDER_LITTLE_SWAP) 
-
+            self.write_values({self.VIBRATION_INTENSITY: intensity})
         def get_vibration_intensity(self):
             """
             Get the vibration intensity.
             """
-            return self.dev.read_float(self.VIBRATION_INTENSITY, 3, 2, modbus.BYTEORDER_LITTLE_SWAP)
-
+            return self._read_float(self.VIBRATION_INTENSITY)
         def set_vibration_go(self, go: bool):
             """
             Set the vibration go.
             """
-            self.dev.write_long(registeraddress=self.VIBRATION_GO, value=int(go), signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.VIBRATION_GO: int(go)})
         def get_vibration_go(self):
             """
             Get the vibration go.
             """
-            return self.dev.read_long(self.VIBRATION_GO, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2)
+            return self._read_long(self.VIBRATION_GO)
 
         def set_vibration_sequence_0123(self, value: int):
-            self.dev.write_long(registeraddress=self.VIBRATION_SEQUENCE_0123, value=value, signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-        
+            self.write_values({self.VIBRATION_SEQUENCE_0123: value})
         def get_vibration_sequence_0123(self):
-            return self.dev.read_long(self.VIBRATION_SEQUENCE_0123, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2) 
+            return self._read_long(self.VIBRATION_SEQUENCE_0123) 
 
         def set_vibration_sequence_3456(self, value: int):
-            self.dev.write_long(registeraddress=self.VIBRATION_SEQUENCE_4567, value=value, signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.VIBRATION_SEQUENCE_4567: value})
         def get_vibration_sequence_3456(self):
-            return self.dev.read_long(self.VIBRATION_SEQUENCE_4567, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2)
+            return self._read_long(self.VIBRATION_SEQUENCE_4567)
 
         def set_led_mode(self, mode: LedMode):
             """
             Set the LED mode.
             """
-            self.dev.write_long(registeraddress=self.LED_MODE, value=int(mode), signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.LED_MODE: int(mode)})
         def get_led_mode(self):
             """
             Get the LED mode.
             """
-            return LedMode(self.dev.read_long(self.LED_MODE, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2))
+            return LedMode(self._read_long(self.LED_MODE))
 
         def set_global_led(self, red, green, blue):
             """
             Set the global LED color. Red, green and blue are between 0 and 255. Only valid when LED mode is GLOBAL_MANUAL.
             """
             val = (blue << 16) | (red << 8) | green
-            self.dev.write_long(registeraddress=self.GLOBAL_MANUAL, value=val, signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.GLOBAL_MANUAL: val})
         def get_global_led(self):
             """
             Get the global LED color.
             """
             # val = (blue << 16) | (red << 8) | green
-            val = self.dev.read_long(self.GLOBAL_MANUAL, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2)
+            val = self._read_long(self.GLOBAL_MANUAL)
             green = val & 0xFF
             red = (val >> 8) & 0xFF
             blue = (val >> 16) & 0xFF
@@ -374,13 +909,12 @@ class Dot:
             Set the individual LED color. Red, green and blue are between 0 and 255. Only valid when LED mode is INDIVIDUAL_MANUAL.
             """
             val = (blue << 16) | (red << 8) | green
-            self.dev.write_long(registeraddress=self.LED_INDIVIDUAL_MANUAL_0 + index * 2, value=val, signed=False, byteorder=modbus.BYTEORDER_LITTLE_SWAP, number_of_registers=2)
-
+            self.write_values({self.LED_INDIVIDUAL_MANUAL_0 + index * 2: val})
         def get_individual_led(self, index):
             """
             Get the individual LED color.
             """
-            val = self.dev.read_long(self.LED_INDIVIDUAL_MANUAL_0 + index * 2, 3, False, modbus.BYTEORDER_LITTLE_SWAP, 2)
+            val = self._read_long(self.LED_INDIVIDUAL_MANUAL_0 + index * 2)
             green = val & 0xFF
             red = (val >> 8) & 0xFF
             blue = (val >> 16) & 0xFF
@@ -388,9 +922,10 @@ class Dot:
     
 
     ## high level methods
-    def set_vibration_sequence(self, sequence: List[VibrationWaveforms]):
+    @staticmethod
+    def sequence_values(sequence: List[VibrationWaveforms]) -> Dict[int, object]:
         """
-        Set the vibration sequence, with up to 8 waveforms.
+        Get the {register address: value} of the two vibration sequence registers for up to 8 waveforms.
         """
         if(len(sequence) > 8):
             raise ValueError("Sequence must be 8 waveforms or less")
@@ -400,37 +935,111 @@ class Dot:
         for i in range(0, len(sequence)):
             sequence_words[i // 4] |= sequence[i] << (i % 4) * 8
 
-        # write the sequence words to the device
-        self.registers.set_vibration_sequence_0123(sequence_words[0])
-        self.registers.set_vibration_sequence_3456(sequence_words[1])
+        return {Dot.V63Registers.VIBRATION_SEQUENCE_0123: sequence_words[0],
+                Dot.V63Registers.VIBRATION_SEQUENCE_4567: sequence_words[1]}
+
+    def set_vibration_sequence(self, sequence: List[VibrationWaveforms]):
+        """
+        Set the vibration sequence, with up to 8 waveforms.
+        """
+        # both sequence words go out in one frame, and not at all if the Dot already holds this sequence
+        self.registers.write_values(self.sequence_values(sequence))
 
     def start_vibration_sequence(self):
         self.registers.set_vibration_go(True)
     
     def stop_vibration(self):
-        self.registers.set_vibration_go(False) # doesn't do anything (yet)
-        self.registers.set_vibration_intensity(0.0)
+        self.apply_state(vibration_intensity=0.0, vibration_go=False) # go doesn't do anything (yet)
 
     def is_vibration_sequence_playing(self) -> bool:
         return self.registers.get_vibration_go()
 
     def play_vibration_sequence(self, sequence: List[VibrationWaveforms]):
-        self.registers.set_vibration_mode(VibrationMode.LIBRARY)
-        self.set_vibration_sequence(sequence)
+        """
+        Upload a sequence of up to 8 waveforms and rests (VibrationWaveforms.Rest) and start it. The Dot times the
+        sequence itself. Uploading is skipped when the Dot already holds the sequence, leaving a single VIBRATION_GO write.
+        """
+        values = self.sequence_values(sequence)
+        values[self.V63Registers.VIBRATION_MODE] = VibrationMode.LIBRARY
+        self.registers.write_values(values)
         self.start_vibration_sequence()
 
     def play_frequency(self, frequency: float, intensity: float):
-        self.registers.set_vibration_mode(VibrationMode.MANUAL)
-        self.registers.set_vibration_frequency(frequency)
-        self.registers.set_vibration_intensity(intensity)
+        self.apply_state(vibration_mode=VibrationMode.MANUAL, vibration_frequency=frequency, vibration_intensity=intensity)
+
+    def apply_state(self, thermal_mode: ThermalMode = None, thermal_intensity: float = None, skin_temp_target: float = None,
+                    vibration_mode: VibrationMode = None, vibration_frequency: float = None, vibration_intensity: float = None,
+                    vibration_go: bool = None):
+        """
+        Set any subset of the thermal and vibration registers (THERMAL_MODE through VIBRATION_GO). Arguments left as None
+        are not written. Adjacent registers go out in a single write-multiple-registers transaction.
+        """
+        self.registers.write_values(self.state_values(thermal_mode, thermal_intensity, skin_temp_target, vibration_mode,
+                                                      vibration_frequency, vibration_intensity, vibration_go))
+
+    @staticmethod
+    def state_values(thermal_mode=None, thermal_intensity=None, skin_temp_target=None, vibration_mode=None,
+                     vibration_frequency=None, vibration_intensity=None, vibration_go=None) -> Dict[int, object]:
+        """
+        Get the {register address: value} written by apply_state for the given arguments.
+        """
+        r = Dot.V63Registers
+        fields = {
+            r.THERMAL_MODE: thermal_mode,
+            r.THERMAL_INTENSITY: thermal_intensity,
+            r.THERMAL_SKIN_TEMP_TARGET: skin_temp_target,
+            r.VIBRATION_MODE: vibration_mode,
+            r.VIBRATION_FREQUENCY: vibration_frequency,
+            r.VIBRATION_INTENSITY: vibration_intensity,
+            r.VIBRATION_GO: vibration_go,
+        }
+        return {address: value for address, value in fields.items() if value is not None}
+
+    def apply_led(self, mode: LedMode = None, red: int = None, green: int = None, blue: int = None):
+        """
+        Set the LED mode and/or the global LED color in a single transaction. The color is only written if red, green
+        and blue are all given.
+        """
+        self.registers.write_values(self.led_values(mode, red, green, blue))
+
+    @staticmethod
+    def led_values(mode=None, red=None, green=None, blue=None) -> Dict[int, object]:
+        """
+        Get the {register address: value} written by apply_led for the given arguments.
+        """
+        values = {}
+        if mode is not None:
+            values[Dot.V63Registers.LED_MODE] = mode
+        if red is not None and green is not None and blue is not None:
+            values[Dot.V63Registers.GLOBAL_MANUAL] = (blue << 16) | (red << 8) | green
+        return values
+
+    @staticmethod
+    def led_frame_values(colors) -> Dict[int, object]:
+        """
+        Get the {register address: value} that shows colors, 8 (red, green, blue) triples between 0 and 255 (a list or an
+        8x3 NumPy array), on the individual LEDs.
+        """
+        values = {Dot.V63Registers.LED_MODE: LedMode.INDIVIDUAL_MANUAL}
+        for index, (red, green, blue) in enumerate(colors):
+            if index >= 8:
+                raise ValueError("A LED frame has 8 colors")
+            values[Dot.V63Registers.LED_INDIVIDUAL_MANUAL_0 + index * 2] = (int(blue) << 16) | (int(red) << 8) | int(green)
+        return values
+
+    def set_led_frame(self, colors):
+        """
+        Show a frame of 8 LED colors. LED mode and all individual LED registers (1010-1029) go out in one
+        write-multiple-registers transaction, and only the changed part once the LED mode is already INDIVIDUAL_MANUAL.
+        """
+        self.registers.write_values(self.led_frame_values(colors))
 
     def set_led(self, red: int = None, green: int = None, blue: int = None, index: int = None):
         """
         Set the LED color. If index is None, the color is set for all LEDs. If index is not None, the color is set for the specified LED.
         """
         if index is None:
-            self.registers.set_led_mode(LedMode.GLOBAL_MANUAL)
-            self.registers.set_global_led(red, green, blue)
+            self.apply_led(LedMode.GLOBAL_MANUAL, red, green, blue)
         else:
             self.registers.set_led_mode(LedMode.INDIVIDUAL_MANUAL)
             self.registers.set_individual_led(index, red, green, blue)
@@ -453,8 +1062,7 @@ class Dot:
         """
         if intensity < -1.0 or intensity > 1.0:
             raise ValueError("Intensity must be between -1 and 1")
-        self.registers.set_thermal_mode(ThermalMode.MANUAL)
-        self.registers.set_thermal_intensity(intensity)
+        self.apply_state(thermal_mode=ThermalMode.MANUAL, thermal_intensity=intensity)
 
     def disable_all_thermal(self):
         """
@@ -466,8 +1074,25 @@ class Dot:
         """
         Activate the thermal temperature control.
         """
-        self.registers.set_thermal_mode(ThermalMode.TEMPERATURE_TARGET)
-        self.registers.set_thermal_skin_temp_target(temperature)
+        self.apply_state(thermal_mode=ThermalMode.TEMPERATURE_TARGET, skin_temp_target=temperature)
+
+    def invalidate_cache(self):
+        """
+        Forget everything the register shadow cache knows, so the next writes are sent unconditionally.
+        """
+        self.registers.invalidate()
+
+    def resync(self):
+        """
+        Reload the register shadow cache from the Dot, e.g. after an error or a device reset.
+        """
+        self.registers.resync()
+
+    def cache_stats(self):
+        """
+        Get the number of register writes suppressed by the shadow cache (hits) and sent to the Dot (misses).
+        """
+        return {"hits": self.registers.cache_hits, "misses": self.registers.cache_misses}
 
     def get_skin_temperature(self):
         """
@@ -481,34 +1106,363 @@ class Dot:
         """
         return self.registers.get_sink_temperature()
 
-    def __init__(self, port, id):
+    def read_telemetry(self) -> Dict[str, float]:
+        """
+        Read all temperatures (Celsius) and the thermal power in a single transaction.
+        """
+        return self.registers.read_telemetry()
+
+    def __init__(self, port, id, identity: Dict[str, str] = None):
+        """
+        Connect to the Dot at address id on port. Its identity strings are read from the Dot unless given as identity
+        (see Dot.identity), e.g. from a discovery cache.
+        """
         self.port = port
         self.id = id
         self.registers = self.V63Registers(port, id)
-        self.device_name = _fix_string_endianness(self.registers.dev.read_string(self.V63Registers.DEVICE_NAME,32, 3))
-        self.hardware_id = _fix_string_endianness(self.registers.dev.read_string(self.V63Registers.HARDWARE_ID, 32, 3))
-        self.firmware_id = _fix_string_endianness(self.registers.dev.read_string(self.V63Registers.FIRMWARE_ID, 32, 3)) 
-        self.serial_number = _fix_string_endianness(self.registers.dev.read_string(self.V63Registers.SERIAL_NUMBER, 32, 3))
+        if identity is not None:
+            self.device_name = identity["device_name"]
+            self.hardware_id = identity["hardware_id"]
+            self.firmware_id = identity["firmware_id"]
+            self.serial_number = identity["serial_number"]
+            return
+        self.device_name = self.read_identity_string(self.V63Registers.DEVICE_NAME)
+        self.hardware_id = self.read_identity_string(self.V63Registers.HARDWARE_ID)
+        self.firmware_id = self.read_identity_string(self.V63Registers.FIRMWARE_ID)
+        self.serial_number = self.read_identity_string(self.V63Registers.SERIAL_NUMBER)
+
+    def read_identity_string(self, address) -> str:
+        """
+        Read one of the 32-register identity strings (DEVICE_NAME, HARDWARE_ID, FIRMWARE_ID or SERIAL_NUMBER).
+        """
+        string = self.registers.call(self.registers.dev.read_string, address, 32, 3, register=address,
+                                     retries=READ_RETRIES)
+        return _fix_string_endianness(string)
+
+    def identity(self) -> Dict[str, str]:
+        """
+        Get the identity strings and location of the Dot, as stored in the discovery cache.
+        """
+        return {"port": self.port, "address": self.id, "device_name": self.device_name, "hardware_id": self.hardware_id,
+                "firmware_id": self.firmware_id, "serial_number": self.serial_number}
 
     def __str__(self):
         return f"Dot {self.id} (Name = {self.device_name}, Hardware ID = {self.hardware_id}, Firmware ID = {self.firmware_id}, Serial Number = {self.serial_number})"
 
 
-def discover_devices(maxAddress) -> List[Dot]:
+# register names for metric labels
+_REGISTER_NAMES = {value: name for name, value in vars(Dot.V63Registers).items()
+                   if name.isupper() and type(value) is int}
+
+def _outcome(error: Exception) -> str:
     """
-    Discover all DataFeel Devices connected to the computer.
+    Classify a failed transaction for bus_metrics.
     """
+    if isinstance(error, modbus.NoResponseError):
+        return "timeout"
+    if isinstance(error, modbus.InvalidResponseError):
+        return "invalid_response"
+    if isinstance(error, modbus.SlaveReportedException):
+        return "slave_exception"
+    if isinstance(error, (IOError, serial.SerialException)):
+        return "io_error"
+    return "error"
+
+
+DEFAULT_PROBE_TIMEOUT = 0.02  # seconds, a Dot answers a single-register read well within this at 115200 baud
+
+def _datafeel_ports() -> List[str]:
+    # DATAFEEL_PORTS (e.g. "/dev/pts/3,/dev/pts/4") overrides USB detection, e.g. to use datafeel.simulator
+    override = os.environ.get("DATAFEEL_PORTS")
+    if override:
+        return [port for port in override.split(",") if port]
+    return [port.device for port in serial.tools.list_ports.comports() if port.vid == 0x10c4 and port.pid == 0xea60]
+
+def _probe(registers: Dot.V63Registers, timeout: float) -> bool:
+    """
+    Check with a single-register read and a short timeout whether a Dot answers at the address of registers (raises if
+    not). Runs on the port's I/O worker, so changing the shared port timeout cannot affect other transactions.
+    """
+    port = registers.dev.serial
+    previous = port.timeout
+    port.timeout = timeout
+    try:
+        registers.dev.read_registers(Dot.V63Registers.LED_MODE, 1)
+        return True
+    finally:
+        port.timeout = previous
+
+def _discover_port(port, maxAddress, probe_timeout) -> List[Dot]:
     devices = []
-    # first, find the serial port the Dot is connected to
-    for port in serial.tools.list_ports.comports():
-        if port.vid == 0x10c4 and port.pid == 0xea60:
-            print("found DataFeel Device on port", port.device)
-            
-            for x in range(1, maxAddress + 1):
-                try:
-                    dot = Dot(port.device, x)
-                    devices.append(dot)
-                except Exception as e:
-                    print(f"No device at address {x}")
-            break
-    return devices
\ No newline at end of file
+    for x in range(1, maxAddress + 1):
+        registers = Dot.V63Registers(port, x)
+        try:
+            registers.call(_probe, registers, probe_timeout, register=Dot.V63Registers.LED_MODE, operation="probe")
+        except (IOError, ValueError):
+            print(f"No device at address {x}")
+            continue
+        try:
+            devices.append(Dot(port, x))
+        except Exception as e:
+            print(f"No device at address {x}: {e}")
+    return devices
+
+def discover_devices(maxAddress, probe_timeout: float = DEFAULT_PROBE_TIMEOUT, ports: List[str] = None) -> List[Dot]:
+    """
+    Discover all DataFeel Devices connected to the computer, or on the given serial ports. Every port is searched in
+    parallel; each address is first probed with a cheap single-register read, and only responding Dots have their
+    identity read. The transactions run at the io_priority of the calling thread.
+    """
+    if ports is None:
+        ports = _datafeel_ports()
+    for port in ports:
+        print("found DataFeel Device on port", port)
+    if not ports:
+        return []
+
+    # io_priority is per thread, so carry the caller's over to the threads searching the ports
+    priority = getattr(_io_context, "priority", PRIORITY_NORMAL)
+
+    def discover_port(port):
+        with io_priority(priority):
+            return _discover_port(port, maxAddress, probe_timeout)
+
+    with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+        results = executor.map(discover_port, ports)
+        return [dot for devices in results for dot in devices]
+
+class DotGroup:
+    """
+    Several Dots driven together.
+
+    With broadcast=True (only for groups holding every Dot on their serial ports, as DotRegistry.group() does), a state
+    that all Dots of a port get is written once to the Modbus broadcast address 0 of the port, which all Dots apply without
+    responding. Otherwise every Dot is written at its own address.
+    """
+
+    BROADCAST_ADDRESS = 0
+
+    def __init__(self, dots: List[Dot], broadcast: bool = False):
+        self.dots = list(dots)
+        self.broadcast = broadcast
+
+    def __iter__(self):
+        return iter(self.dots)
+
+    def __len__(self):
+        return len(self.dots)
+
+    def apply_state(self, **state):
+        """
+        Apply the same Dot.apply_state arguments to every Dot in the group.
+        """
+        self.write_values({dot: Dot.state_values(**state) for dot in self.dots})
+
+    def apply_led(self, mode: LedMode = None, red: int = None, green: int = None, blue: int = None):
+        """
+        Apply the same Dot.apply_led arguments to every Dot in the group.
+        """
+        self.write_values({dot: Dot.led_values(mode, red, green, blue) for dot in self.dots})
+
+    def set_led(self, red: int, green: int, blue: int):
+        """
+        Set the global LED color of every Dot in the group.
+        """
+        self.apply_led(LedMode.GLOBAL_MANUAL, red, green, blue)
+
+    def set_led_frame(self, colors):
+        """
+        Show the same frame of 8 LED colors on every Dot in the group, see Dot.set_led_frame.
+        """
+        values = Dot.led_frame_values(colors)
+        self.write_values({dot: values for dot in self.dots})
+
+    def play_vibration_sequence(self, sequence: List[VibrationWaveforms]):
+        """
+        Upload (if needed) and start the same vibration sequence on every Dot in the group, see Dot.play_vibration_sequence.
+        """
+        values = Dot.sequence_values(sequence)
+        values[Dot.V63Registers.VIBRATION_MODE] = VibrationMode.LIBRARY
+        self.write_values({dot: values for dot in self.dots})
+        self.write_values({dot: {Dot.V63Registers.VIBRATION_GO: True} for dot in self.dots})
+
+    def write_values(self, values: Dict[Dot, Dict[int, object]]):
+        """
+        Write {Dot: {register address: value}}. Ports on which all Dots get identical values are written by broadcast.
+
+        The writes for all ports are queued first and only then waited for, so every bus works in parallel on its own
+        I/O worker and the call takes as long as the slowest bus rather than the sum of all of them.
+        """
+        by_port = {}
+        for dot in values:
+            by_port.setdefault(dot.port, []).append(dot)
+
+        futures = []
+        for port, members in by_port.items():
+            first = values[members[0]]
+            if self.broadcast and len(members) > 1 and all(values[dot] == first for dot in members):
+                futures += self._broadcast(port, members, first)
+            else:
+                for dot in members:
+                    futures += dot.registers.submit_values(values[dot])[1]
+
+        # wait for every bus before reporting the first failure
+        errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def _broadcast(self, port, members: List[Dot], values: Dict[int, object]) -> List[Future]:
+        bus = PortWorker.for_port(port).broadcast_registers()
+
+        # the broadcast address only knows the register values all members agree on
+        common = dict(members[0].registers.shadow)
+        for dot in members[1:]:
+            shadow = dot.registers.shadow
+            common = {address: word for address, word in common.items() if shadow.get(address) == word}
+        with bus._lock:
+            bus.shadow = common
+            written, futures = bus.submit_values(values)
+        for dot in members:
+            for future in futures:
+                dot.registers._begin_write(written)
+                future.add_done_callback(lambda f, dot=dot, span=list(written): dot.registers._end_write(span, f.exception() is not None))
+        return futures
+
+
+class DotRegistry:
+    """
+    Long-lived registry of connected Dots.
+
+    Discovery runs once (at startup) and the resulting Dots are kept, keyed by serial number, so their serial
+    ports stay open and callers only pay for the register writes of their effects.
+    """
+
+    def __init__(self, maxAddress: int, rediscover_interval: float = 5.0, cache_path: str = None,
+                 probe_timeout: float = DEFAULT_PROBE_TIMEOUT):
+        self.maxAddress = maxAddress
+        self.rediscover_interval = rediscover_interval
+        self.cache_path = cache_path
+        self.probe_timeout = probe_timeout
+        self._dots = {}
+        self._lock = threading.Lock()
+        self._last_discovery = None
+        self._verify_thread = None
+
+    def discover(self, use_cache: bool = True) -> List[Dot]:
+        """
+        (Re)run device discovery and replace the registered Dots.
+
+        If a discovery cache is configured and present, the Dots are registered from it without touching the bus, and
+        a background thread then re-discovers the bus and replaces them if the topology changed.
+        """
+        with self._lock:
+            cached = self._load_cache() if use_cache else None
+            if not cached:
+                return self._discover_locked()
+
+            self._last_discovery = time.monotonic()
+            self._dots = {dot.serial_number: dot for dot in cached}
+            self._verify_thread = threading.Thread(target=self._verify, name="dot-discovery", daemon=True)
+            self._verify_thread.start()
+            return list(self._dots.values())
+
+    def _discover_locked(self) -> List[Dot]:
+        self._last_discovery = time.monotonic()
+        self._dots = {dot.serial_number: dot for dot in discover_devices(self.maxAddress, self.probe_timeout)}
+        self._resync(self._dots.values())
+        self._save_cache()
+        return list(self._dots.values())
+
+    def _resync(self, dots):
+        for dot in dots:
+            # preload the shadow cache so later writes can be merged and deduplicated
+            try:
+                dot.resync()
+            except Exception as e:
+                print(f"Could not read registers of {dot}: {e}")
+
+    def _verify(self):
+        """
+        Check the Dots registered from the cache against the bus, in the background and at low I/O priority.
+        """
+        with io_priority(PRIORITY_LOW):
+            with self._lock:
+                cached = list(self._dots.values())
+            # these Dots may already be written to; resync keeps the shadowed words of writes made during its read
+            self._resync(cached)
+            found = discover_devices(self.maxAddress, self.probe_timeout)
+
+            topology = {tuple(sorted(dot.identity().items())) for dot in found}
+            if topology == {tuple(sorted(dot.identity().items())) for dot in cached}:
+                return  # cache was right, keep the Dots (and shadow caches) already in use
+
+            print("Dot topology changed since the discovery cache was written, replacing it")
+            self._resync(found)
+            with self._lock:
+                self._dots = {dot.serial_number: dot for dot in found}
+                self._save_cache()
+
+    def _load_cache(self) -> List[Dot]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+        try:
+            with open(self.cache_path) as f:
+                entries = json.load(f)["dots"]
+            return [Dot(entry["port"], entry["address"], identity=entry) for entry in entries]
+        except Exception as e:
+            print(f"Ignoring discovery cache {self.cache_path}: {e}")
+            return None
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, "w") as f:
+                json.dump({"dots": [dot.identity() for dot in self._dots.values()]}, f, indent=2)
+        except OSError as e:
+            print(f"Could not write discovery cache {self.cache_path}: {e}")
+
+    def dots(self) -> List[Dot]:
+        """
+        Get the registered Dots. If none are registered, discovery is retried at most once per rediscover_interval.
+        """
+        with self._lock:
+            if not self._dots and (self._last_discovery is None or time.monotonic() - self._last_discovery >= self.rediscover_interval):
+                self._discover_locked()
+            return list(self._dots.values())
+
+    def group(self) -> DotGroup:
+        """
+        Get a DotGroup of all registered Dots, which may use broadcast writes since it covers every Dot on each port.
+        """
+        return DotGroup(self.dots(), broadcast=True)
+
+    def get(self, serial_number: str) -> Dot:
+        """
+        Get a registered Dot by serial number, or None.
+        """
+        with self._lock:
+            return self._dots.get(serial_number)
+
+    def remove(self, serial_number: str):
+        """
+        Forget a Dot, e.g. after it stopped responding. It will be found again by the next discovery.
+        """
+        with self._lock:
+            self._dots.pop(serial_number, None)
+
+    def close(self):
+        """
+        Stop the I/O workers and close the serial ports of all registered Dots.
+        """
+        with self._lock:
+            for worker in {dot.registers.worker for dot in self._dots.values()}:
+                worker.stop()
+            for dot in self._dots.values():
+                dot.registers.dev.serial.close()
+            self._dots = {}
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dots)
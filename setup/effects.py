@@ -0,0 +1,237 @@
+import heapq
+import itertools
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from .device import VibrationWaveforms
+
+LEDS_PER_DOT = 8
+
+NEUTRAL_TEMP = 0.0
+LED_NEUTRAL = (255, 255, 255)
+PULSE_SECONDS = 1.5
+WORD_CUE_SECONDS = 0.4
+
+# On-device vibration library waveforms used for each vibration frequency band (upper bound in Hz), weakest first
+VIBRATION_WAVEFORM_BANDS = [
+    (120, [VibrationWaveforms.SOFT_BUMP_P30, VibrationWaveforms.SOFT_BUMP_P60, VibrationWaveforms.SOFT_BUMP_P100]),
+    (160, [VibrationWaveforms.PULSING_MEDIUM2_P60, VibrationWaveforms.PULSING_MEDIUM1_P100]),
+    (200, [VibrationWaveforms.BUZZ5_P20, VibrationWaveforms.BUZZ4_P40, VibrationWaveforms.BUZZ3_P60,
+           VibrationWaveforms.BUZZ2_P80, VibrationWaveforms.BUZZ1_P100]),
+    (float("inf"), [VibrationWaveforms.SHARP_TICK3_P60, VibrationWaveforms.SHARP_TICK2_P80, VibrationWaveforms.SHARP_TICK1_P100]),
+]
+VIBRATION_BEAT_SECONDS = 0.375  # one waveform plus the rest after it
+
+
+class EffectScheduler:
+    """
+    Runs timed haptic effects on a dedicated thread, so request handlers return immediately.
+
+    An effect is a list of (offset in seconds, action) steps. Effects are keyed by what they drive: playing a new effect
+    with the same key drops the steps of the previous one that have not run yet, so a newer effect cleanly preempts an
+    older one (including its revert to neutral).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._generations = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="effect-scheduler", daemon=True)
+        self._thread.start()
+
+    def play(self, steps: List[Tuple[float, Callable[[], None]]], key="dots"):
+        """
+        Schedule the steps of an effect, preempting the previous effect with the same key.
+        """
+        now = time.monotonic()
+        with self._cond:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            for offset, action in steps:
+                heapq.heappush(self._heap, (now + offset, next(self._counter), key, generation, action))
+            self._cond.notify()
+
+    def pulse(self, apply: Callable[[], None], revert: Callable[[], None], duration: float, key="dots"):
+        """
+        Run apply now and revert after duration seconds, unless a newer effect with the same key comes first.
+        """
+        self.play([(0.0, apply), (duration, revert)], key)
+
+    def cancel(self, key="dots"):
+        """
+        Drop the pending steps of the effect with the given key.
+        """
+        with self._cond:
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def pending(self) -> int:
+        """
+        Get the number of steps still waiting to run.
+        """
+        with self._cond:
+            return sum(1 for _, _, key, generation, _ in self._heap if self._generations.get(key) == generation)
+
+    def stop(self):
+        """
+        Stop the scheduler thread. Pending steps are dropped.
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if not self._running:
+                    return
+                _, _, key, generation, action = heapq.heappop(self._heap)
+                if self._generations.get(key) != generation:
+                    continue  # preempted by a newer effect
+
+            try:
+                action()
+            except Exception as e:
+                print(f"Haptic effect step failed: {e}")
+
+
+def gradient_frame(color, level: float):
+    """
+    Build an LED frame that fills the ring of 8 LEDs up to level (0.0 - 1.0) with color, fading out the last lit LED,
+    e.g. to show an emotion's intensity.
+    """
+    lit = max(0.0, min(level, 1.0)) * LEDS_PER_DOT
+    frame = []
+    for index in range(LEDS_PER_DOT):
+        brightness = max(0.0, min(lit - index, 1.0))
+        frame.append(tuple(int(c * brightness) for c in color))
+    return frame
+
+
+def adjust_intensity(color, intensity):
+    """ Adjust LED brightness by scaling RGB values based on intensity (0.5 - 1.0) """
+    return tuple(int(c * intensity) for c in color)
+
+
+@lru_cache(maxsize=None)
+def compile_vibration_sequence(vibration, intensity, duration=PULSE_SECONDS):
+    """
+    Compile a vibration frequency and intensity into an on-device sequence of up to 8 waveforms and rests lasting about
+    duration seconds. The frequency picks the waveform family, the intensity its strength.
+    """
+    waveforms = next(family for limit, family in VIBRATION_WAVEFORM_BANDS if vibration <= limit)
+    waveform = waveforms[round(min(max(intensity, 0.0), 1.0) * (len(waveforms) - 1))]
+    beats = min(4, max(1, round(duration / VIBRATION_BEAT_SECONDS)))
+
+    sequence = []
+    for _ in range(beats):
+        sequence += [waveform, VibrationWaveforms.Rest(VIBRATION_BEAT_SECONDS / 2)]
+    return tuple(sequence[:-1])  # no rest needed after the last waveform
+
+
+def play_haptic(devices, led, vibration, intensity, temperature, duration=PULSE_SECONDS):
+    """ Set the LED color and heating/cooling, and start the compiled vibration sequence on all dots. """
+    devices.set_led(*led)
+    devices.apply_state(thermal_intensity=temperature)
+    devices.play_vibration_sequence(compile_vibration_sequence(vibration, intensity, duration))
+
+
+def revert_haptic(devices, reset_temperature=True):
+    """ Dim the LEDs to neutral and, unless disabled, reset the thermal intensity. The vibration sequence ends by itself. """
+    if reset_temperature:
+        devices.apply_state(thermal_intensity=NEUTRAL_TEMP)
+    adjusted_led = adjust_intensity(LED_NEUTRAL, .3)
+    devices.set_led(*adjusted_led)
+
+
+class LedAnimator:
+    """
+    Streams LED frames (8 RGB colors, see Dot.set_led_frame) to a Dot or DotGroup at a target frame rate on its own
+    thread. Only the newest frame is kept: if the bus falls behind, frames pushed in the meantime are dropped instead
+    of queued, so the LEDs always show the latest state.
+    """
+
+    def __init__(self, target, fps: float = 30.0):
+        self.target = target
+        self.fps = fps
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self._frame = None
+        self._source = None
+        self._start_time = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="led-animator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def push(self, frame):
+        """
+        Show frame at the next tick, replacing a frame that has not been sent yet.
+        """
+        with self._cond:
+            if self._frame is not None:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._source = None
+            self._cond.notify()
+
+    def play(self, source: Callable[[float], object]):
+        """
+        Animate from source, which is called with the seconds since play() at every tick and returns the frame to show
+        (or None to stop the animation).
+        """
+        with self._cond:
+            self._source = source
+            self._start_time = time.monotonic()
+            self._frame = None
+            self._cond.notify()
+
+    def _run(self):
+        period = 1.0 / self.fps
+        next_tick = time.monotonic()
+        while True:
+            with self._cond:
+                while self._running and self._frame is None and self._source is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, self._frame = self._frame, None
+                source, start_time = self._source, self._start_time
+
+            if frame is None:
+                frame = source(time.monotonic() - start_time)
+                if frame is None:
+                    with self._cond:
+                        if self._source is source:
+                            self._source = None
+                    continue
+
+            try:
+                self.target.set_led_frame(frame)
+                self.frames_sent += 1
+            except Exception as e:
+                print(f"LED frame failed: {e}")
+
+            # ticks missed while the bus was busy are skipped, not caught up
+            next_tick = max(next_tick + period, time.monotonic())
+            time.sleep(max(0.0, next_tick - time.monotonic()))
@@ -0,0 +1,106 @@
+"""
+Low-overhead counters and latency histograms of Modbus transactions, rendered in the Prometheus text format.
+"""
+from bisect import bisect_left
+import threading
+from typing import Dict, Tuple
+
+# upper bounds in seconds; a frame at 115200 baud takes about 1-5 ms on the wire
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+TRANSACTION_LABELS = ("port", "address", "register", "operation")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def render_metric(name: str, kind: str, help: str, samples: Dict[Tuple, float], label_names=()) -> str:
+    """
+    Render one counter or gauge with samples given as {label values: value}.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for values, value in samples.items():
+        labels = _labels(label_names, values)
+        lines.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class BusMetrics:
+    """
+    Counts Modbus transactions by outcome ("ok", "timeout", "invalid_response" for CRC or framing errors,
+    "slave_exception", "io_error" or "error") and retries, and keeps a latency histogram per
+    (port, slave address, register, operation).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._transactions = {}
+        self._retries = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, port, address, register, operation, duration: float, outcome: str = "ok"):
+        """
+        Record a transaction that took duration seconds.
+        """
+        labels = (port, address, register, operation)
+        with self._lock:
+            key = labels + (outcome,)
+            self._transactions[key] = self._transactions.get(key, 0) + 1
+            histogram = self._histograms.get(labels)
+            if histogram is None:
+                # per bucket counts, plus the overflow count, the sum and the count
+                histogram = self._histograms[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            histogram[bisect_left(self.buckets, duration)] += 1
+            histogram[-2] += duration
+            histogram[-1] += 1
+
+    def retry(self, port, address, register, operation):
+        """
+        Record that a failed transaction is retried.
+        """
+        labels = (port, address, register, operation)
+        with self._lock:
+            self._retries[labels] = self._retries.get(labels, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._transactions.clear()
+            self._retries.clear()
+            self._histograms.clear()
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text format.
+        """
+        with self._lock:
+            transactions = dict(self._transactions)
+            retries = dict(self._retries)
+            histograms = {labels: list(histogram) for labels, histogram in self._histograms.items()}
+
+        text = render_metric("datafeel_modbus_transactions_total", "counter", "Modbus transactions by outcome.",
+                             transactions, TRANSACTION_LABELS + ("outcome",))
+        text += render_metric("datafeel_modbus_retries_total", "counter", "Modbus transactions retried after an error.",
+                              retries, TRANSACTION_LABELS)
+
+        name = "datafeel_modbus_transaction_duration_seconds"
+        lines = [f"# HELP {name} Duration of Modbus transactions on the bus.", f"# TYPE {name} histogram"]
+        for labels, histogram in histograms.items():
+            label_text = _labels(TRANSACTION_LABELS, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{label_text},le="+Inf"}} {histogram[-1]}')
+            lines.append(f"{name}_sum{{{label_text}}} {histogram[-2]}")
+            lines.append(f"{name}_count{{{label_text}}} {histogram[-1]}")
+        return text + "\n".join(lines) + "\n"
+
+
+# transactions of all Dots are recorded here
+bus_metrics = BusMetrics()
@@ -0,0 +1,315 @@
+"""
+Virtual DataFeel Dots for benchmarking and testing without hardware.
+
+A DotSimulator is a Modbus RTU slave on a Linux pseudo-terminal that answers for one or more simulated Dots with the
+Dot.V63Registers map. discover_devices, minimalmodbus and the rest of the device layer talk to it unchanged:
+
+    with DotSimulator([SimulatedDot(1), SimulatedDot(2)], latency=0.002) as simulator:
+        dots = discover_devices(4, ports=[simulator.port])
+
+or from a shell (point the app at it with DATAFEEL_PORTS=<port>):
+
+    python -m datafeel.simulator --dots 4 --latency 0.002 --drop-rate 0.01
+"""
+import argparse
+import os
+import random
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+from typing import Dict, List
+
+from .device import Dot, _crc16, _float_to_registers, _registers_to_float
+
+READ_HOLDING_REGISTERS = 3
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_REGISTERS = 16
+
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+ILLEGAL_DATA_VALUE = 3
+
+IDENTITY_REGISTERS = 32
+AMBIENT_TEMPERATURE = 30.0  # Celsius
+
+
+def _string_to_registers(string: str) -> List[int]:
+    """
+    Encode an identity string the way a Dot stores it: 64 bytes, NUL padded, bytes swapped within each register.
+    """
+    data = string.encode("latin1")[:2 * IDENTITY_REGISTERS].ljust(2 * IDENTITY_REGISTERS, b"\0")
+    return [data[i] | (data[i + 1] << 8) for i in range(0, len(data), 2)]
+
+
+class SimulatedDot:
+    """
+    Register map of one simulated Dot.
+
+    Identity strings and all RW registers read back what was written. The temperatures follow a first order model: the
+    skin temperature moves towards AMBIENT_TEMPERATURE + heating * THERMAL_INTENSITY with time constant tau.
+    """
+
+    RW_START = Dot.V63Registers.LED_MODE
+    RW_END = Dot.V63Registers.VIBRATION_SEQUENCE_4567 + 2
+    TELEMETRY_START = Dot.V63Registers.SKIN_TEMP
+    TELEMETRY_END = Dot.V63Registers.THERMAL_POWER + 2
+
+    def __init__(self, address: int, serial_number: str = None, device_name: str = "DataFeel Dot",
+                 hardware_id: str = "V6.3", firmware_id: str = "simulated", heating: float = 10.0, tau: float = 5.0):
+        self.address = address
+        self.heating = heating
+        self.tau = tau
+        self.identity = {
+            Dot.V63Registers.DEVICE_NAME: _string_to_registers(device_name),
+            Dot.V63Registers.HARDWARE_ID: _string_to_registers(hardware_id),
+            Dot.V63Registers.FIRMWARE_ID: _string_to_registers(firmware_id),
+            Dot.V63Registers.SERIAL_NUMBER: _string_to_registers(serial_number or f"SIM{address:05d}"),
+        }
+        self.registers = {address: 0 for address in range(self.RW_START, self.RW_END)}
+        self.skin_temperature = AMBIENT_TEMPERATURE
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def read(self, start: int, count: int) -> List[int]:
+        """
+        Read count registers from start. Raises KeyError if the range leaves the register map.
+        """
+        with self._lock:
+            self._update_thermal()
+            words = []
+            for address in range(start, start + count):
+                words.append(self._read_word(address))
+            return words
+
+    def write(self, start: int, words: List[int]):
+        """
+        Write words from start. Raises KeyError if the range leaves the RW registers.
+        """
+        with self._lock:
+            self._update_thermal()
+            for address in range(start, start + len(words)):
+                if address not in self.registers:
+                    raise KeyError(address)
+            for address, word in zip(range(start, start + len(words)), words):
+                self.registers[address] = word
+
+    def _read_word(self, address: int) -> int:
+        for base, words in self.identity.items():
+            if base <= address < base + IDENTITY_REGISTERS:
+                return words[address - base]
+        if self.TELEMETRY_START <= address < self.TELEMETRY_END:
+            telemetry = self._telemetry_registers()
+            return telemetry[address - self.TELEMETRY_START]
+        return self.registers[address]
+
+    def _thermal_intensity(self) -> float:
+        address = Dot.V63Registers.THERMAL_INTENSITY
+        return _registers_to_float([self.registers[address], self.registers[address + 1]])
+
+    def _update_thermal(self):
+        now = time.monotonic()
+        target = AMBIENT_TEMPERATURE + self.heating * self._thermal_intensity()
+        step = min(1.0, (now - self._updated) / self.tau)
+        self.skin_temperature += (target - self.skin_temperature) * step
+        self._updated = now
+
+    def _telemetry_registers(self) -> List[int]:
+        intensity = self._thermal_intensity()
+        skin = self.skin_temperature
+        values = (skin, AMBIENT_TEMPERATURE - self.heating * intensity, AMBIENT_TEMPERATURE + 5.0,
+                  AMBIENT_TEMPERATURE + 5.0 + 10.0 * abs(intensity), abs(intensity))
+        words = []
+        for value in values:
+            words.extend(_float_to_registers(value))
+        return words
+
+
+class DotSimulator:
+    """
+    Modbus RTU slave on a pseudo-terminal that answers for a set of SimulatedDots.
+
+    Timing model per request: the transmission time of the request and response at baudrate (bits per byte = 10) plus
+    latency seconds of processing time, with up to jitter seconds of uniformly distributed extra delay. Faults: a
+    request is left unanswered with probability drop_rate, and a response has its CRC corrupted with probability
+    corrupt_rate. Frames addressed to 0 are applied by every Dot and never answered.
+    """
+
+    def __init__(self, dots: List[SimulatedDot], baudrate: int = 115200, latency: float = 0.001, jitter: float = 0.0,
+                 drop_rate: float = 0.0, corrupt_rate: float = 0.0, seed: int = None):
+        self.dots: Dict[int, SimulatedDot] = {dot.address: dot for dot in dots}
+        self.baudrate = baudrate
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.random = random.Random(seed)
+
+        self.frames_received = 0
+        self.frames_answered = 0
+        self.frames_dropped = 0
+        self.frames_corrupted = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        attributes = termios.tcgetattr(self._slave)
+        attributes[3] &= ~termios.ECHO
+        termios.tcsetattr(self._slave, termios.TCSANOW, attributes)
+        self.port = os.ttyname(self._slave)
+
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="dot-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {"frames_received": self.frames_received, "frames_answered": self.frames_answered,
+                "frames_dropped": self.frames_dropped, "frames_corrupted": self.frames_corrupted,
+                "bytes_received": self.bytes_received, "bytes_sent": self.bytes_sent}
+
+    def _transmission_time(self, length: int) -> float:
+        return length * 10.0 / self.baudrate
+
+    def _run(self):
+        buffer = b""
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                # a partial frame followed by silence is discarded, as a real slave does after the 3.5 character gap
+                buffer = b""
+                continue
+            try:
+                buffer += os.read(self._master, 1024)
+            except OSError:
+                return
+            while True:
+                length = self._frame_length(buffer)
+                if length is None or len(buffer) < length:
+                    break
+                frame, buffer = buffer[:length], buffer[length:]
+                self._handle(frame)
+
+    @staticmethod
+    def _frame_length(buffer: bytes):
+        if len(buffer) < 2:
+            return None
+        function = buffer[1]
+        if function == WRITE_MULTIPLE_REGISTERS:
+            return 9 + buffer[6] if len(buffer) >= 7 else None
+        return 8  # read holding registers, write single register, and anything we answer with ILLEGAL_FUNCTION
+
+    def _handle(self, frame: bytes):
+        self.frames_received += 1
+        self.bytes_received += len(frame)
+        time.sleep(self._transmission_time(len(frame)))
+        if _crc16(frame[:-2]) != frame[-2:]:
+            return  # slaves silently ignore frames with a bad CRC
+
+        address, function = frame[0], frame[1]
+        if address == 0:
+            targets = list(self.dots.values())
+        elif address in self.dots:
+            targets = [self.dots[address]]
+        else:
+            return
+
+        payload = None
+        for dot in targets:
+            payload = self._execute(dot, function, frame[2:-2])
+        if address == 0 or payload is None:
+            return
+
+        time.sleep(self.latency + self.random.uniform(0.0, self.jitter))
+        if self.random.random() < self.drop_rate:
+            self.frames_dropped += 1
+            return
+        response = bytes([address]) + payload
+        crc = _crc16(response)
+        if self.random.random() < self.corrupt_rate:
+            self.frames_corrupted += 1
+            crc = bytes([crc[0] ^ 0xFF, crc[1]])
+        response += crc
+        time.sleep(self._transmission_time(len(response)))
+        os.write(self._master, response)
+        self.frames_answered += 1
+        self.bytes_sent += len(response)
+
+    @staticmethod
+    def _execute(dot: SimulatedDot, function: int, data: bytes) -> bytes:
+        """
+        Run one request on dot and get the response PDU (function code and data).
+        """
+        try:
+            if function == READ_HOLDING_REGISTERS:
+                start, count = struct.unpack(">HH", data[:4])
+                if not 1 <= count <= 125:
+                    return bytes([function | 0x80, ILLEGAL_DATA_VALUE])
+                words = dot.read(start, count)
+                return bytes([function, 2 * count]) + struct.pack(f">{count}H", *words)
+            if function == WRITE_SINGLE_REGISTER:
+                start, word = struct.unpack(">HH", data[:4])
+                dot.write(start, [word])
+                return bytes([function]) + data[:4]
+            if function == WRITE_MULTIPLE_REGISTERS:
+                start, count, length = struct.unpack(">HHB", data[:5])
+                if length != 2 * count:
+                    return bytes([function | 0x80, ILLEGAL_DATA_VALUE])
+                dot.write(start, list(struct.unpack(f">{count}H", data[5:5 + length])))
+                return bytes([function]) + data[:4]
+        except KeyError:
+            return bytes([function | 0x80, ILLEGAL_DATA_ADDRESS])
+        return bytes([function | 0x80, ILLEGAL_FUNCTION])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate DataFeel Dots on a pseudo-terminal.")
+    parser.add_argument("--dots", type=int, default=4, help="number of Dots, at addresses 1 to DOTS")
+    parser.add_argument("--baudrate", type=int, default=115200)
+    parser.add_argument("--latency", type=float, default=0.001, help="processing time per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum random extra latency in seconds")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="probability of not answering a request")
+    parser.add_argument("--corrupt-rate", type=float, default=0.0, help="probability of a response with a bad CRC")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = DotSimulator([SimulatedDot(address) for address in range(1, args.dots + 1)], args.baudrate,
+                             args.latency, args.jitter, args.drop_rate, args.corrupt_rate, args.seed)
+    with simulator:
+        print(f"Simulating {args.dots} Dots on {simulator.port} (DATAFEEL_PORTS={simulator.port})", flush=True)
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+    print(simulator.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from array import array
+import threading
+import time
+from typing import Callable, Dict, List
+
+from .device import Dot, PRIORITY_LOW, TELEMETRY_FIELDS, io_priority
+
+
+class RingBuffer:
+    """
+    Fixed-size ring buffer of telemetry samples, stored in one flat array of doubles (timestamp followed by the
+    TELEMETRY_FIELDS values). Once full, the oldest sample is overwritten.
+    """
+
+    WIDTH = 1 + len(TELEMETRY_FIELDS)
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = array('d', bytes(8 * capacity * self.WIDTH))
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp: float, values: Dict[str, float]):
+        """
+        Store a sample taken at timestamp (seconds since the epoch).
+        """
+        with self._lock:
+            offset = self._next * self.WIDTH
+            self._data[offset] = timestamp
+            for i, field in enumerate(TELEMETRY_FIELDS):
+                self._data[offset + 1 + i] = values[field]
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def samples(self, n: int = None) -> List[Dict[str, float]]:
+        """
+        Get the last n samples (all if None), oldest first.
+        """
+        with self._lock:
+            n = self._count if n is None else max(0, min(n, self._count))
+            result = []
+            for k in range(self._next - n, self._next):
+                offset = (k % self.capacity) * self.WIDTH
+                sample = {"time": self._data[offset]}
+                sample.update(zip(TELEMETRY_FIELDS, self._data[offset + 1:offset + self.WIDTH]))
+                result.append(sample)
+            return result
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+
+class TelemetrySampler:
+    """
+    Background thread that reads the telemetry block of every Dot at a fixed interval, one transaction per Dot at low
+    I/O priority, and keeps the samples in a RingBuffer per serial number. Readers get cached samples and never touch
+    the bus.
+    """
+
+    def __init__(self, dots: Callable[[], List[Dot]], interval: float = 1.0, capacity: int = 600):
+        self.dots = dots
+        self.interval = interval
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="telemetry-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def samples(self, n: int = None) -> Dict[str, List[Dict[str, float]]]:
+        """
+        Get the last n samples (all if None) of every Dot, keyed by serial number.
+        """
+        with self._lock:
+            buffers = dict(self._buffers)
+        return {serial_number: buffer.samples(n) for serial_number, buffer in buffers.items()}
+
+    def sample_once(self):
+        """
+        Read the telemetry of every Dot once.
+        """
+        with io_priority(PRIORITY_LOW):
+            for dot in self.dots():
+                try:
+                    values = dot.read_telemetry()
+                except Exception as e:
+                    print(f"Telemetry read failed for {dot}: {e}")
+                    continue
+                with self._lock:
+                    buffer = self._buffers.get(dot.serial_number)
+                    if buffer is None:
+                        buffer = self._buffers[dot.serial_number] = RingBuffer(self.capacity)
+                buffer.append(time.time(), values)
+
+    def _run(self):
+        next_time = time.monotonic()
+        while not self._stop.is_set():
+            self.sample_once()
+            # if sampling fell behind, skip the missed ticks instead of bursting
+            next_time = max(next_time + self.interval, time.monotonic())
+            self._stop.wait(max(0.0, next_time - time.monotonic()))
@@ -0,0 +1,15 @@
+"""
+The app imports the setup folder as the datafeel package (see README); map it the same way for the tests.
+"""
+import importlib.util
+import os
+import sys
+
+SETUP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "setup")
+
+if "datafeel" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("datafeel", os.path.join(SETUP, "__init__.py"),
+                                                  submodule_search_locations=[SETUP])
+    datafeel = importlib.util.module_from_spec(spec)
+    sys.modules["datafeel"] = datafeel
+    spec.loader.exec_module(datafeel)
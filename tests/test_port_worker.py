@@ -0,0 +1,48 @@
+"""
+Regression tests of the PortWorker write queue, against simulated Dots. conftest.py maps the setup folder to the
+datafeel package, as the app imports it:
+
+    python -m pytest tests
+"""
+import threading
+import unittest
+
+from datafeel.device import Dot
+from datafeel.simulator import DotSimulator, SimulatedDot
+
+R = Dot.V63Registers
+
+
+class CoalescingOrderTest(unittest.TestCase):
+    def setUp(self):
+        self.dot = SimulatedDot(1)
+        self.simulator = DotSimulator([self.dot], latency=0.0).start()
+        self.registers = R(self.simulator.port, 1)
+
+    def tearDown(self):
+        self.registers.worker.stop()
+        self.registers.dev.serial.close()
+        self.simulator.close()
+
+    def test_replacing_write_does_not_overtake_newer_overlapping_write(self):
+        # hold the worker so all three writes are pending at once
+        gate = threading.Event()
+        self.registers.worker.submit(gate.wait)
+        futures = []
+        for values in ({R.THERMAL_MODE: 1, R.THERMAL_INTENSITY: 0.5, R.THERMAL_SKIN_TEMP_TARGET: 30.0,
+                        R.VIBRATION_MODE: 1, R.VIBRATION_FREQUENCY: 100.0, R.VIBRATION_INTENSITY: 0.5, R.VIBRATION_GO: 1},
+                       {R.VIBRATION_MODE: 0, R.VIBRATION_FREQUENCY: 200.0},
+                       {R.THERMAL_MODE: 0, R.THERMAL_INTENSITY: 0.25, R.THERMAL_SKIN_TEMP_TARGET: 31.0,
+                        R.VIBRATION_MODE: 2, R.VIBRATION_FREQUENCY: 150.0, R.VIBRATION_INTENSITY: 0.75, R.VIBRATION_GO: 1}):
+            futures += self.registers.submit_values(values)[1]
+        gate.set()
+        for future in futures:
+            future.result(timeout=5)
+
+        span = range(R.THERMAL_MODE, R.VIBRATION_GO + 2)
+        self.assertEqual([self.dot.registers[a] for a in span], [self.registers.shadow[a] for a in span])
+        self.assertAlmostEqual(self.registers.get_vibration_frequency(), 150.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Regression tests of the register shadow cache against simulated Dots: words read back from a Dot must never replace
+newer shadowed words of writes still in flight.
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from datafeel.device import Dot, DotRegistry, PortWorker, PRIORITY_HIGH, PRIORITY_LOW, io_priority
+from datafeel.simulator import DotSimulator, SimulatedDot
+
+R = Dot.V63Registers
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.001)
+
+
+class ReadBackTest(unittest.TestCase):
+    def setUp(self):
+        self.dot = SimulatedDot(1)
+        self.simulator = DotSimulator([self.dot], latency=0.0).start()
+        self.registers = R(self.simulator.port, 1)
+
+    def tearDown(self):
+        self.registers.worker.stop()
+        self.registers.dev.serial.close()
+        self.simulator.close()
+
+    def test_read_overtaking_a_queued_write_keeps_the_written_value(self):
+        gate = threading.Event()
+        self.registers.worker.submit(gate.wait)
+        wait_for(lambda: self.registers.worker.depth() == 0)
+        with io_priority(PRIORITY_LOW):
+            self.registers.write_values({R.VIBRATION_FREQUENCY: 150.0}, wait=False)
+
+        # the high priority read runs before the write and sees the old frequency
+        read = []
+
+        def read_frequency():
+            with io_priority(PRIORITY_HIGH):
+                read.append(self.registers.get_vibration_frequency())
+
+        reader = threading.Thread(target=read_frequency)
+        reader.start()
+        wait_for(lambda: self.registers.worker.depth() == 2)
+        gate.set()
+        reader.join(5)
+        self.assertEqual(read, [0.0])
+
+        # so the shadow must still hold the written frequency, and writing the old one again must go out
+        self.registers.write_values({R.VIBRATION_FREQUENCY: 0.0})
+        span = range(R.VIBRATION_FREQUENCY, R.VIBRATION_FREQUENCY + 2)
+        self.assertEqual([self.dot.registers[a] for a in span], [self.registers.shadow[a] for a in span])
+        self.assertAlmostEqual(self.registers.get_vibration_frequency(), 0.0)
+
+
+class CachedDiscoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.dots = [SimulatedDot(1), SimulatedDot(2)]
+        self.simulator = DotSimulator(self.dots, latency=0.0).start()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.directory.name, "dot_topology.json")
+        os.environ["DATAFEEL_PORTS"] = self.simulator.port
+        DotRegistry(2, cache_path=self.cache_path).discover(use_cache=False)
+        self.worker = PortWorker.for_port(self.simulator.port)
+
+    def tearDown(self):
+        del os.environ["DATAFEEL_PORTS"]
+        self.worker.stop()
+        self.simulator.close()
+        self.directory.cleanup()
+
+    def test_write_during_background_verification_stays_in_the_shadow(self):
+        # hold the bus until the verification has queued its read of the first Dot's registers
+        gate = threading.Event()
+        self.worker.submit(gate.wait)
+        wait_for(lambda: self.worker.depth() == 0)
+        registry = DotRegistry(2, cache_path=self.cache_path)
+        registry.discover()
+        wait_for(lambda: self.worker.depth() == 1)
+
+        # an effect written while that read is in flight: queued behind it, so the read sees the old LED color
+        group = registry.group()
+
+        def set_led():
+            with io_priority(PRIORITY_LOW):
+                group.set_led(1, 2, 3)
+
+        submitted = threading.Thread(target=set_led)
+        submitted.start()
+        wait_for(lambda: self.worker.depth() == 2)
+        gate.set()
+        submitted.join(5)
+        registry._verify_thread.join(10)
+
+        span = range(R.LED_MODE, R.GLOBAL_MANUAL + 2)
+        for dot, simulated in zip(group, self.dots):
+            self.assertEqual([dot.registers.shadow.get(a) for a in span], [simulated.registers[a] for a in span])
+            self.assertNotEqual(simulated.registers[R.GLOBAL_MANUAL], 0)
+            dot.set_led(0, 0, 0)
+            self.assertEqual([simulated.registers[a] for a in (R.GLOBAL_MANUAL, R.GLOBAL_MANUAL + 1)], [0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()